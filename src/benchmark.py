@@ -0,0 +1,377 @@
+import argparse
+import json
+import os
+import pickle
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+import numpy as np
+from src.cli import build_selections
+from src.core.simulator import Simulator
+from src.core.worker_pool import get_worker_pool
+from src.model.enum.banner_type import BannerType
+from src.model.enum.engine_type import EngineType
+from src.model.enum.simulation_type import SimulationType
+from src.util.paths import get_external_path
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, peak memory is reported as None there
+    resource = None
+
+# Benchmark harness, run as python -m src.benchmark. Every case runs in its own interpreter,
+# so peak memory and pool startup are measured from a cold start.
+
+ROOT = Path(__file__).parent.parent
+
+# Fixed inputs shared by every case, plans are drawn from the patch database
+SEED = 12345
+ACCOUNT = {
+    "current_jewels": 50_000,
+    "plat_tickets": 20,
+    "plat_coins": 10,
+    "starting_pity_character": 0,
+    "starting_pity_weapon": 0,
+    "buy_bp": True,
+    "bp_days_left": 20,
+    "buy_monthly_sub": True,
+    "sub_days_left": 15
+}
+
+HEAVY_BANNER = {"awareness": 2, "pull_weapon": True, "refinement": 2}
+
+# Case name -> luck, banner type and a function building the plan from the list of patches
+CASES = {
+    "single_banner": (SimulationType.AVERAGE_LUCK, BannerType.CHANCE,
+                      lambda patches: {patches[0]["version"]: {}}),
+    "full_chance": (SimulationType.AVERAGE_LUCK, BannerType.CHANCE,
+                    lambda patches: {patch["version"]: {} for patch in patches}),
+    "heavy": (SimulationType.AVERAGE_LUCK, BannerType.CHANCE,
+              lambda patches: {patch["version"]: HEAVY_BANNER for patch in patches[:6]}),
+    "worst_luck": (SimulationType.WORST_LUCK, BannerType.CHANCE,
+                   lambda patches: {patch["version"]: {} for patch in patches})
+}
+
+# Runs per case, sized so every engine takes seconds rather than minutes
+DEFAULT_RUNS = {
+    EngineType.SCALAR: 10_000,
+    EngineType.BATCH: 100_000,
+    EngineType.EXACT: 1
+}
+
+# Metric -> whether higher values are better, the metrics a baseline comparison checks
+TRACKED_METRICS = {
+    "runs_per_second": True,
+    "seconds": False,
+    "peak_rss_kb": False,
+    "peak_worker_rss_kb": False,
+    "ipc_bytes": False,
+    "pool_startup_seconds": False
+}
+
+# Metric -> smallest baseline value worth comparing. Timings this short are mostly noise, a relative change of
+# them says nothing about the code
+METRIC_FLOORS = {
+    "runs_per_second": 0,
+    "seconds": 1.0,
+    "peak_rss_kb": 0,
+    "peak_worker_rss_kb": 0,
+    "ipc_bytes": 0,
+    "pool_startup_seconds": 0.05
+}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m src.benchmark",
+        description="Benchmark the simulation engines on fixed plans and compare against a stored baseline."
+    )
+
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--engines", nargs="+", choices=[engine_type.name.lower() for engine_type in EngineType],
+                        default=[engine_type.name.lower() for engine_type in EngineType])
+    parser.add_argument("--runs", type=int, default=None, help="Runs per case, defaults to a per-engine count")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes, defaults to the CPU count")
+    parser.add_argument("--output", "-o", default=None, help="Write the results JSON to this file, defaults to stdout")
+    parser.add_argument("--baseline", default=None, help="Results JSON of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed relative change of a tracked metric before it counts as a regression")
+
+    # Internal, runs a single case in this process and prints its metrics
+    parser.add_argument("--run-case", default=None, help=argparse.SUPPRESS)
+
+    return parser
+
+
+def run_case(case_name, engine_type, runs, workers):
+    """
+    Run a single benchmark case in this process.
+
+    :param case_name: Key of CASES
+    :param engine_type: EngineType to benchmark
+    :param runs: Number of simulation runs
+    :param workers: Number of worker processes, None for the CPU count
+
+    Returns:
+        Dictionary of the case's metrics
+    """
+    simulation_type, banner_type, build_plan = CASES[case_name]
+
+    with open(get_external_path("patch_db.json"), "r") as f:
+        patches = json.load(f).get("patches", [])
+
+    worker_pool = get_worker_pool()
+    worker_pool.resize(workers)
+
+    start = time.perf_counter()
+    worker_pool.warm_up()
+    pool_startup_seconds = time.perf_counter() - start
+
+    simulator = Simulator(
+        simulation_type,
+        banner_type,
+        *ACCOUNT.values(),
+        build_selections(patches, build_plan(patches)),
+        engine_type=engine_type,
+        seed=SEED
+    )
+
+    ipc_recorder = IpcRecorder(worker_pool)
+
+    try:
+        start = time.perf_counter()
+        results = simulator.run_simulations(max_runs=runs)
+        seconds = time.perf_counter() - start - ipc_recorder.seconds
+    except ValueError as e:
+        worker_pool.shutdown()
+
+        return {"error": str(e)}
+    finally:
+        ipc_recorder.detach()
+
+    # Workers only count towards the children's peak once they were joined
+    worker_pool.shutdown()
+
+    metrics = {
+        "total_runs": results["total_runs"],
+        "success_rate": float(results["success_rate"]),
+        "seconds": seconds,
+        "runs_per_second": results["total_runs"] / seconds if engine_type != EngineType.EXACT else None,
+        "ipc_bytes": ipc_recorder.bytes,
+        "pool_startup_seconds": pool_startup_seconds,
+        "workers": worker_pool.processes,
+        "peak_rss_kb": None,
+        "peak_worker_rss_kb": None
+    }
+
+    if resource is not None:
+        # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere
+        divisor = 1024 if sys.platform == "darwin" else 1
+        metrics["peak_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // divisor
+        metrics["peak_worker_rss_kb"] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss // divisor
+
+    return metrics
+
+
+class IpcRecorder:
+    """
+    Adds up the pickled size of every task sent to the workers and every result sent back while a forecast runs.
+
+    Tasks run in-process cross no process boundary and are not counted.
+    """
+
+    def __init__(self, worker_pool):
+        """
+        :param worker_pool: WorkerPool whose tasks are recorded until detach is called
+        """
+        self.worker_pool = worker_pool
+        self.bytes = 0
+
+        # Time spent pickling for the measurement, to be taken out of the timed section
+        self.seconds = 0.0
+
+        worker_pool.imap_tasks = self._imap_tasks
+
+
+    def detach(self):
+        del self.worker_pool.imap_tasks
+
+
+    def _imap_tasks(self, func, tasks, cancel_token=None):
+        results = type(self.worker_pool).imap_tasks(self.worker_pool, func, tasks, cancel_token)
+
+        if len(tasks) == 1 or self.worker_pool.processes == 1:
+            return results
+
+        self.bytes += self._pickled_size(tasks)
+
+        return self._record_results(results)
+
+
+    def _record_results(self, results):
+        for result in results:
+            self.bytes += self._pickled_size([result])
+
+            yield result
+
+
+    def _pickled_size(self, values):
+        start = time.perf_counter()
+        size = sum(len(pickle.dumps(value)) for value in values)
+        self.seconds += time.perf_counter() - start
+
+        return size
+
+
+def run_benchmarks(cases, engine_types, runs=None, workers=None):
+    """
+    Run every case with every engine, each in a fresh interpreter.
+
+    Returns:
+        Results dictionary with the environment and the metrics of every "case/engine" pair
+    """
+    results = {
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "workers": workers or os.cpu_count()
+        },
+        "cases": {}
+    }
+
+    for case_name in cases:
+        for engine_type in engine_types:
+            command = [
+                sys.executable, "-m", "src.benchmark",
+                "--run-case", case_name,
+                "--engines", engine_type.name.lower(),
+                "--runs", str(runs or DEFAULT_RUNS[engine_type])
+            ]
+
+            if workers is not None:
+                command += ["--workers", str(workers)]
+
+            completed = subprocess.run(command, cwd=ROOT, capture_output=True, text=True)
+
+            if completed.returncode == 0:
+                metrics = json.loads(completed.stdout.strip().splitlines()[-1])
+            else:
+                metrics = {"error": completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "failed"}
+
+            results["cases"][f"{case_name}/{engine_type.name.lower()}"] = metrics
+            print(_format_metrics(f"{case_name}/{engine_type.name.lower()}", metrics), file=sys.stderr)
+
+    return results
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """
+    Find the tracked metrics that got worse than the baseline by more than the tolerance.
+
+    Cases or metrics missing from either side, or that errored, are not compared. Neither are metrics whose
+    baseline value is below their floor in METRIC_FLOORS, and the pool startup when a single worker was used.
+
+    :param results: Results dictionary of run_benchmarks
+    :param baseline: Results dictionary of an earlier run
+    :param tolerance: Allowed relative change, e.g. 0.25 for 25%
+
+    Returns:
+        List of human readable regression descriptions
+    """
+    regressions = []
+
+    for case, metrics in results["cases"].items():
+        baseline_metrics = baseline.get("cases", {}).get(case)
+
+        if baseline_metrics is None or "error" in metrics or "error" in baseline_metrics:
+            continue
+
+        for metric, higher_is_better in TRACKED_METRICS.items():
+            value = metrics.get(metric)
+            reference = baseline_metrics.get(metric)
+
+            if value is None or not reference or _below_floor(metric, metrics, baseline_metrics):
+                continue
+
+            change = (value - reference) / reference
+
+            if (higher_is_better and change < -tolerance) or (not higher_is_better and change > tolerance):
+                regressions.append(f"{case} {metric}: {reference:,.2f} -> {value:,.2f} ({change:+.1%})")
+
+    return regressions
+
+
+def _below_floor(metric, metrics, baseline_metrics):
+    """
+    Whether a metric of a case is too small on both sides for a relative change to be meaningful.
+    """
+    if metric == "pool_startup_seconds" and 1 in (metrics.get("workers"), baseline_metrics.get("workers")):
+        # No worker processes are started
+        return True
+
+    # Throughput of a case running for a fraction of a second is as noisy as its duration
+    floor_metric = "seconds" if metric == "runs_per_second" else metric
+    floor = METRIC_FLOORS[floor_metric]
+
+    return all((side.get(floor_metric) or 0) < floor for side in (metrics, baseline_metrics))
+
+
+def _format_metrics(case, metrics):
+    if "error" in metrics:
+        return f"{case}: error: {metrics['error']}"
+
+    runs_per_second = metrics["runs_per_second"]
+    speed = f"{runs_per_second:,.0f} runs/s" if runs_per_second is not None else "exact"
+
+    return f"{case}: {speed}, {metrics['seconds']:.2f}s, peak RSS {metrics['peak_rss_kb']} kB, IPC {metrics['ipc_bytes']:,} B"
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    engine_types = [EngineType[engine.upper()] for engine in args.engines]
+
+    if args.run_case is not None:
+        engine_type = engine_types[0]
+        metrics = run_case(args.run_case, engine_type, args.runs or DEFAULT_RUNS[engine_type], args.workers)
+        print(json.dumps(metrics))
+
+        return 0
+
+    baseline = None
+
+    if args.baseline:
+        try:
+            with open(args.baseline, "r") as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            parser.error(f"Cannot read baseline: {e}")
+
+    results = run_benchmarks(args.cases, engine_types, args.runs, args.workers)
+    output = json.dumps(results, indent=2)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        sys.stdout.write(output + "\n")
+
+    if baseline is not None:
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
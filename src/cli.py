@@ -0,0 +1,270 @@
+import argparse
+import csv
+import io
+import json
+import sys
+import numpy as np
+from src.core.simulator import Simulator
+from src.core.budget_solver import find_required_jewels
+from src.core.trace_engine import TraceEngine, JsonLinesSink
+from src.core.worker_pool import get_worker_pool
+from src.model.enum.banner_type import BannerType
+from src.model.enum.engine_type import EngineType
+from src.model.enum.simulation_type import SimulationType
+from src.util.paths import get_external_path
+
+# Headless entry point, must never import anything from src.gui
+
+SIMULATION_TYPES = {
+    "average": SimulationType.AVERAGE_LUCK,
+    "below-average": SimulationType.BELOW_AVERAGE_LUCK,
+    "worst": SimulationType.WORST_LUCK
+}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m src.cli",
+        description="Run a P5X pull forecast without the GUI and write the results as JSON or CSV."
+    )
+
+    parser.add_argument("plan", help="JSON file mapping patch versions to awareness, pull_weapon and refinement")
+    parser.add_argument("--patch-db", default=None, help="Path of patch_db.json, defaults to the bundled one")
+
+    account = parser.add_argument_group("account")
+    account.add_argument("--jewels", type=int, default=0, help="Meta Jewels held")
+    account.add_argument("--tickets", type=int, default=0, help="Platinum Tickets held")
+    account.add_argument("--coins", type=int, default=0, help="Platinum Milicoins held")
+    account.add_argument("--char-pity", type=int, default=0, help="Current character banner pity")
+    account.add_argument("--weapon-pity", type=int, default=0, help="Current weapon banner pity")
+    account.add_argument("--bp-days-left", type=int, default=None,
+                         help="Days left on the Phantom Pass, passes are only bought if set")
+    account.add_argument("--sub-days-left", type=int, default=None,
+                         help="Days left on the monthly subscription, subscriptions are only bought if set")
+
+    simulation = parser.add_argument_group("simulation")
+    simulation.add_argument("--banner-type", choices=[banner_type.name.lower() for banner_type in BannerType],
+                            default="chance")
+    simulation.add_argument("--luck", choices=list(SIMULATION_TYPES), default="average")
+    simulation.add_argument("--engine", choices=[engine_type.name.lower() for engine_type in EngineType],
+                            default="batch")
+    simulation.add_argument("--runs", type=int, default=None, help="Maximum number of simulation runs")
+    simulation.add_argument("--precision", type=float, default=None,
+                            help="Stop once the 95%% confidence interval half-width is below this many percentage points")
+    simulation.add_argument("--time-limit", type=float, default=None, help="Stop starting new chunks after this many seconds")
+    simulation.add_argument("--seed", type=int, default=None, help="Master seed, a random one is reported if omitted")
+    simulation.add_argument("--required-jewels", type=float, default=None, metavar="SUCCESS_RATE",
+                            help="Instead of a forecast, find the starting jewels needed for this success rate in percent")
+    simulation.add_argument("--trace", action="store_true",
+                            help="Instead of a forecast, trace the first scalar run of the seed and write its events as JSON lines")
+    simulation.add_argument("--workers", type=int, default=None, help="Number of worker processes, defaults to the CPU count")
+    simulation.add_argument("--profile", action="store_true",
+                            help="Time the phases of the forecast and write the profile to stderr as a JSON line")
+
+    output = parser.add_argument_group("output")
+    output.add_argument("--format", choices=["json", "csv"], default="json")
+    output.add_argument("--output", "-o", default=None, help="Output file, defaults to stdout")
+
+    return parser
+
+
+def load_selections(plan_path, patch_db_path=None):
+    """
+    Build the selected banners in the format of BannerSelector.get_selections.
+
+    Every patch of the patch database is included, so unselected patches still contribute their income.
+
+    :param plan_path: Path of a JSON file mapping patch versions to their awareness, pull_weapon and refinement
+    :param patch_db_path: Path of patch_db.json, None for the bundled one
+
+    Returns:
+        Dictionary of patch versions and their configs
+    """
+    with open(patch_db_path or get_external_path("patch_db.json"), "r") as f:
+        patches = json.load(f).get("patches", [])
+
+    with open(plan_path, "r") as f:
+        plan = json.load(f)
+
+    return build_selections(patches, plan)
+
+
+def build_selections(patches, plan):
+    """
+    Build the selected banners in the format of BannerSelector.get_selections from a parsed plan.
+
+    :param patches: List of patches of the patch database
+    :param plan: Dictionary mapping patch versions to their awareness, pull_weapon and refinement
+
+    Returns:
+        Dictionary of patch versions and their configs
+    """
+    known_versions = {patch["version"] for patch in patches}
+    unknown_versions = [version for version in plan if version not in known_versions]
+
+    if unknown_versions:
+        raise ValueError(f"Unknown patch versions in plan: {', '.join(unknown_versions)}")
+
+    selections = {}
+
+    for patch in patches:
+        patch_version = patch["version"]
+        banner = plan.get(patch_version)
+
+        selections[patch_version] = {
+            "patch_type": patch["patch_type"],
+            "pull_char": banner is not None,
+            "featured_character": patch["featured_character"],
+            "awareness": int(banner.get("awareness", 0)) if banner else 0,
+            "pull_weapon": bool(banner.get("pull_weapon", False)) if banner else False,
+            "refinement": int(banner.get("refinement", 0)) if banner else 0
+        }
+
+    return selections
+
+
+def results_to_json(results):
+    """
+    Convert a results dictionary to JSON, flattening the failure breakdown into a list of objects.
+    """
+    output = {key: value for key, value in results.items() if key != "failure_breakdown"}
+    output["failure_breakdown"] = [
+        {"patch": patch, "failure_type": failure_type, "featured_character": name, **data}
+        for (patch, failure_type, name), data in results["failure_breakdown"]
+    ]
+
+    return json.dumps(output, indent=2, default=_to_builtin)
+
+
+def results_to_csv(results):
+    """
+    Convert a results dictionary to a single CSV row, with one failure rate column per failure point.
+    """
+    lower, upper = results["confidence_interval"]
+    row = {
+        "success_rate": results["success_rate"],
+        "confidence_lower": lower,
+        "confidence_upper": upper,
+        "successful_runs": results["successful_runs"],
+        "total_runs": results["total_runs"],
+        "seed": results["seed"]
+    }
+
+    for (patch, failure_type, _), data in results["failure_breakdown"]:
+        row[f"{patch} {failure_type}"] = data["count"] / results["total_runs"] * 100
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(row), lineterminator="\n")
+    writer.writeheader()
+    writer.writerow({key: _to_builtin(value) for key, value in row.items()})
+
+    return buffer.getvalue()
+
+
+def budget_to_json(budget):
+    return json.dumps(budget, indent=2)
+
+
+def budget_to_csv(budget):
+    lower, upper = budget["confidence_interval"]
+    row = {key: value for key, value in budget.items() if key != "confidence_interval"}
+    row["confidence_lower"] = lower
+    row["confidence_upper"] = upper
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(row), lineterminator="\n")
+    writer.writeheader()
+    writer.writerow(row)
+
+    return buffer.getvalue()
+
+
+def write_trace(simulator, output_path=None):
+    """
+    Trace a single run and write its events as JSON lines.
+
+    :param simulator: Simulator to trace
+    :param output_path: Output file, None for stdout
+
+    Returns:
+        Exit status, 0
+    """
+    if output_path is None:
+        TraceEngine(simulator, JsonLinesSink(sys.stdout)).run()
+
+        return 0
+
+    with open(output_path, "w") as f:
+        TraceEngine(simulator, JsonLinesSink(f)).run()
+
+    return 0
+
+
+def _to_builtin(value):
+    if isinstance(value, np.generic):
+        return value.item()
+
+    return value
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    try:
+        selections = load_selections(args.plan, args.patch_db)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    if args.workers is not None:
+        get_worker_pool().resize(args.workers)
+
+    try:
+        simulator = Simulator(
+            SIMULATION_TYPES[args.luck],
+            BannerType[args.banner_type.upper()],
+            args.jewels,
+            args.tickets,
+            args.coins,
+            args.char_pity,
+            args.weapon_pity,
+            args.bp_days_left is not None,
+            args.bp_days_left or 0,
+            args.sub_days_left is not None,
+            args.sub_days_left or 0,
+            selections,
+            engine_type=EngineType[args.engine.upper()],
+            seed=args.seed
+        )
+
+        if args.trace:
+            return write_trace(simulator, args.output)
+
+        if args.required_jewels is not None:
+            results = find_required_jewels(simulator, args.required_jewels, args.runs)
+        else:
+            results = simulator.run_simulations(args.precision, args.runs, args.time_limit, profile=args.profile)
+    except ValueError as e:
+        parser.error(str(e))
+    finally:
+        get_worker_pool().shutdown()
+
+    if args.required_jewels is not None:
+        output = budget_to_json(results) if args.format == "json" else budget_to_csv(results)
+    else:
+        output = results_to_json(results) if args.format == "json" else results_to_csv(results)
+
+    if "profile" in results:
+        print(json.dumps(results["profile"]), file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w", newline="") as f:
+            f.write(output)
+    else:
+        sys.stdout.write(output)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
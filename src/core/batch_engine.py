@@ -0,0 +1,463 @@
+import copy
+import math
+import numpy as np
+from src.core.random_pool import RunStreams
+from src.model.enum.banner_type import BannerType
+from src.model.simulation_aggregate import SimulationAggregate
+from src.model.account_batch import AccountBatch
+from src.model.batch_checkpoint import BatchCheckpoint
+from src.core.constants import (
+    CHAR_RATE_TARGETED, CHAR_PITY_TARGETED, CHAR_RATE_CHANCE, CHAR_PITY_CHANCE, WEAPON_RATE, WEAPON_PITY,
+    CHAR_JEWEL_COST, WEAPON_JEWEL_COST, CONIGEM_CONVERSION_RATE, CONIGEM_JEWEL_VALUE, CONIGEM_WEALTH,
+    FOUR_STAR_INTERVAL
+)
+
+NEVER = np.iinfo(np.int64).max
+
+# Jewels added to every run when tracking budgets, large enough that no run ever runs dry
+BUDGET_OFFSET = 1_000_000_000
+
+
+class BatchEngine:
+    """
+    Vectorized simulation engine.
+
+    Holds the currencies and pity counters of every run as NumPy arrays and advances all still-active runs
+    one pull at a time with masked array operations, reproducing the rules of Simulator._run.
+    """
+
+    def __init__(self, simulator, seed):
+        """
+        Initialize the engine for the given simulator configuration.
+
+        :param simulator: Simulator holding the account, banner configs, banner type and luck modifier
+        :param seed: Seed or SeedSequence of the chunk, every run draws from its own stream of it
+        """
+        self.simulator = simulator
+        self.seed = seed
+
+        # RunStreams of the runs being simulated, created by run
+        self.streams = None
+
+        self.char_cost = CHAR_JEWEL_COST
+        self.weapon_cost = WEAPON_JEWEL_COST
+
+        if simulator.banner_type == BannerType.CHANCE:
+            self.char_rate = CHAR_RATE_CHANCE * simulator.luck_mod
+            self.char_pity_cap = CHAR_PITY_CHANCE
+            self.char_fifty_fifty = True
+        else:
+            self.char_rate = CHAR_RATE_TARGETED * simulator.luck_mod
+            self.char_pity_cap = CHAR_PITY_TARGETED
+            self.char_fifty_fifty = False
+
+        self.weapon_rate = WEAPON_RATE * simulator.luck_mod
+        self.weapon_pity_cap = WEAPON_PITY
+        self.fifty_fifty_threshold = 0.5 * simulator.luck_mod
+
+        # Per-run lowest jewel value left after paying for a pull, only tracked by required_jewels
+        self.lowest_wealth = None
+
+        # Per-run boolean array of the last run call, whether the run obtained everything planned
+        self.succeeded = None
+
+        # Pulls simulated and random numbers drawn, reported when profiling
+        self.pull_count = 0
+        self.rng_draws = 0
+
+
+    def required_jewels(self, num_runs):
+        """
+        Simulate num_runs forecasts with an unlimited jewel budget and find the starting jewels each run needed.
+
+        As long as no pull fails, a run's outcomes do not depend on its jewels, so a run succeeds with J starting
+        jewels exactly when J covers its deepest point. Within one pull sequence the jewel value before a jewel paid
+        pull never rises (a 4-star refunds at most the cost of one pull), so only the last jewel paid pull of every
+        sequence is checked.
+
+        :param num_runs: Number of simulation runs
+
+        Returns:
+            Array with the smallest number of starting jewels with which each run obtains everything planned
+        """
+        self.lowest_wealth = np.full(num_runs, NEVER, dtype=np.int64)
+        self.run(num_runs)
+
+        starting_wealth = self.simulator.account.current_jewels + BUDGET_OFFSET
+
+        return np.maximum(starting_wealth - self.lowest_wealth, 0)
+
+
+    def run(self, num_runs, resume=None, checkpoints=None, first_checkpoint=1):
+        """
+        Simulate num_runs forecasts in lockstep.
+
+        :param num_runs: Number of simulation runs
+        :param resume: Optional BatchCheckpoint of the same chunk to continue from instead of the first banner,
+                       the banners it covers must be unchanged in the plan
+        :param checkpoints: Optional list a BatchCheckpoint is appended to after every simulated banner but the last
+        :param first_checkpoint: Number of banners done from which on checkpoints are appended
+
+        Returns:
+            SimulationAggregate of all runs
+        """
+        plan = self.simulator.plan
+        self.streams = RunStreams(self.seed, num_runs)
+
+        if resume is None:
+            self.accounts = AccountBatch(self.simulator.account, num_runs)
+
+            if self.lowest_wealth is not None:
+                self.accounts.jewels += BUDGET_OFFSET
+
+            all_succeeded = np.ones(num_runs, dtype=bool)
+            aggregate = SimulationAggregate()
+            first_banner = 0
+        else:
+            self.accounts = resume.accounts.copy()
+            self.streams.counters = resume.draw_counters.copy()
+            all_succeeded = resume.all_succeeded.copy()
+            aggregate = copy.deepcopy(resume.aggregate)
+            first_banner = resume.banners_done
+
+        # Budget tracking runs hold unlimited jewels, their spend is not recorded
+        record_spend = self.lowest_wealth is None
+
+        for position in range(first_banner, len(plan)):
+            target = plan[position]
+            self._apply_income(target)
+
+            if record_spend:
+                holdings_before = self.accounts.holdings()
+
+            patch_version = target.patch_version
+            char_name = target.featured_character
+            awareness = target.awareness
+            refinement = target.refinement
+            pull_weapon = target.pull_weapon
+
+            # Base character plus awareness copies, each run stops at its first failure
+            char_success = np.ones(num_runs, dtype=bool)
+            for _ in range(awareness + 1):
+                char_success = self._pull_character(char_success)
+
+            char_obtained = char_success.copy()
+            self._count_failure(aggregate, (patch_version, "character", char_name), ~char_success)
+
+            if pull_weapon:
+                weapon_success = self._pull_weapon(char_success)
+                weapon_obtained = weapon_success.copy()
+                self._count_failure(aggregate, (patch_version, "weapon", char_name),
+                                    char_success & ~weapon_success)
+                proceed = weapon_success
+            else:
+                weapon_success = np.zeros(num_runs, dtype=bool)
+                weapon_obtained = weapon_success
+                proceed = char_success
+
+            duplicates_obtained = self._count_successive_pulls(self._pull_character, proceed, awareness)
+            refinements_obtained = self._count_successive_pulls(self._pull_weapon, proceed, refinement)
+
+            awareness_failed = proceed & (duplicates_obtained < awareness)
+            char_obtained &= ~awareness_failed
+            self._count_failure(aggregate, (patch_version, "awareness", char_name),
+                                awareness_failed, duplicates_obtained, awareness)
+
+            refinement_failed = weapon_success & (refinements_obtained < refinement)
+            weapon_obtained &= ~refinement_failed
+            self._count_failure(aggregate, (patch_version, "refinement", char_name),
+                                refinement_failed, refinements_obtained, refinement)
+
+            all_succeeded &= char_obtained
+
+            if pull_weapon:
+                all_succeeded &= weapon_obtained
+
+            if record_spend:
+                spent = holdings_before - self.accounts.holdings()
+                aggregate.add_spend([patch_version], spent[:, np.newaxis, :])
+
+            if checkpoints is not None and first_checkpoint <= position + 1 < len(plan):
+                checkpoints.append(BatchCheckpoint(
+                    position + 1,
+                    self.accounts.copy(),
+                    all_succeeded.copy(),
+                    copy.deepcopy(aggregate),
+                    self.streams.counters.copy()
+                ))
+
+        aggregate.add_runs(num_runs, np.count_nonzero(all_succeeded))
+        self.succeeded = all_succeeded
+
+        if record_spend:
+            aggregate.add_leftover(self.accounts.holdings())
+
+        return aggregate
+
+
+    def _apply_income(self, target):
+        """
+        Income does not depend on pull outcomes, so the precomputed income of the banner is added to every run.
+        """
+        self.accounts.add_income(target.jewels, target.tickets, target.coins)
+
+
+    def _pull_character(self, mask):
+        return self._pull_until_featured(
+            mask,
+            self.accounts.tickets,
+            self.accounts.char_pity,
+            self.accounts.char_4star,
+            self.char_cost,
+            self.char_rate,
+            self.char_pity_cap,
+            self.char_fifty_fifty
+        )
+
+
+    def _pull_weapon(self, mask):
+        return self._pull_until_featured(
+            mask,
+            self.accounts.coins,
+            self.accounts.weapon_pity,
+            self.accounts.weapon_4star,
+            self.weapon_cost,
+            self.weapon_rate,
+            self.weapon_pity_cap,
+            True
+        )
+
+
+    def _pull_until_featured(self, mask, currency, pity, counter_4star, jewel_cost, rate, pity_cap, fifty_fifty):
+        """
+        Pull on a banner for every run in mask until the featured unit is obtained or the run runs dry.
+
+        Every active run makes exactly one pull per step, so pity and the 4-star counter of a run are tracked as
+        a base value plus the steps taken since. Each step only compares the step index against the next event
+        of every run, which is either a featured hit or the first pull it cannot afford without converting
+        conigems, the exact point where the reference engine converts them. Natural hits are drawn as geometric
+        countdowns, which is equivalent to one Bernoulli draw per pull, and 4-star rewards are credited lazily.
+
+        :param mask: Boolean array of the runs that pull on this banner
+        :param currency: Per-run array of the banner specific currency (tickets or coins), updated in place
+        :param pity: Per-run pity array of this banner, updated in place
+        :param counter_4star: Per-run 4-star counter array of this banner, updated in place
+        :param jewel_cost: Jewel cost of a single pull
+        :param rate: Luck adjusted featured rate
+        :param pity_cap: Hard pity of this banner
+        :param fifty_fifty: Whether the featured unit is subject to a 50/50
+
+        Returns:
+            Boolean array marking the runs that obtained the featured unit
+        """
+        success = np.zeros(mask.size, dtype=bool)
+        idx = np.flatnonzero(mask)
+
+        if idx.size == 0:
+            return success
+
+        size = idx.size
+        zeros = np.zeros(size, dtype=np.int64)
+
+        state = {
+            "currency": currency[idx],
+            "jewels": self.accounts.jewels[idx],
+            "conigems": self.accounts.conigems[idx],
+            "pity_base": pity[idx],
+            "pity_step": zeros.copy(),
+            "counter_base": counter_4star[idx],
+            "counter_step": zeros.copy(),
+            "settled": zeros.copy(),
+            "end_step": zeros.copy(),
+            "guaranteed": np.zeros(size, dtype=bool),
+            "start_currency": currency[idx]
+        }
+        state["affordable"] = state["currency"] + state["jewels"] // jewel_cost
+        state["natural_at"] = self._draw_next_hit(0, idx, rate)
+        state["hit_at"] = np.minimum(state["natural_at"], np.maximum(pity_cap - state["pity_base"], 1))
+        state["four_star_at"] = np.maximum(FOUR_STAR_INTERVAL - state["counter_base"], 1)
+        state["event_at"] = np.minimum(state["hit_at"], state["affordable"] + 1)
+
+        num_active = size
+        step = 0
+
+        while idx.size:
+            step += 1
+
+            rows = np.flatnonzero(state["event_at"] == step)
+
+            if rows.size == 0:
+                continue
+
+            out_of_funds = rows[state["affordable"][rows] < step]
+
+            if out_of_funds.size:
+                self._settle(state, out_of_funds, step - 1, jewel_cost)
+                self._credit_four_stars(state, out_of_funds, step - 1)
+
+                conigems = state["conigems"][out_of_funds]
+                conversions = np.where(conigems >= CONIGEM_CONVERSION_RATE, conigems // CONIGEM_CONVERSION_RATE, 0)
+                state["jewels"][out_of_funds] += conversions * CONIGEM_JEWEL_VALUE
+                state["conigems"][out_of_funds] -= conversions * CONIGEM_CONVERSION_RATE
+                state["affordable"][out_of_funds] = (step - 1) + state["jewels"][out_of_funds] // jewel_cost
+
+                broke = out_of_funds[state["affordable"][out_of_funds] < step]
+                state["end_step"][broke] = step - 1
+                state["event_at"][broke] = NEVER
+                num_active -= broke.size
+
+                rows = rows[state["event_at"][rows] != NEVER]
+
+            hits = rows[state["hit_at"][rows] == step]
+
+            if hits.size:
+                # No 4-star on the hard pity pull, the counter keeps running and triggers on the next pull
+                hard_pity = hits[state["pity_base"][hits] + (step - state["pity_step"][hits]) >= pity_cap]
+                self._credit_four_stars(state, hard_pity, step - 1)
+                deferred = hard_pity[state["four_star_at"][hard_pity] == step]
+                state["four_star_at"][deferred] = step + 1
+
+                natural = hits[state["natural_at"][hits] == step]
+                state["natural_at"][natural] = self._draw_next_hit(step, idx[natural], rate)
+                state["pity_base"][hits] = 0
+                state["pity_step"][hits] = step
+                state["hit_at"][hits] = np.minimum(state["natural_at"][hits], step + pity_cap)
+
+                if fifty_fifty:
+                    contested = hits[~state["guaranteed"][hits]]
+                    lost = contested[self.streams.uniform(idx[contested]) >= self.fifty_fifty_threshold]
+                    self.rng_draws += contested.size
+                    state["guaranteed"][lost] = True
+                    won = np.setdiff1d(hits, lost, assume_unique=True)
+                else:
+                    won = hits
+
+                state["event_at"][rows] = np.minimum(state["hit_at"][rows], state["affordable"][rows] + 1)
+
+                self._settle(state, won, step, jewel_cost)
+                state["end_step"][won] = step
+                state["event_at"][won] = NEVER
+                success[idx[won]] = True
+                num_active -= won.size
+            else:
+                state["event_at"][rows] = np.minimum(state["hit_at"][rows], state["affordable"][rows] + 1)
+
+            if num_active * 2 <= idx.size:
+                finished = state["event_at"] == NEVER
+                finished_rows = np.flatnonzero(finished)
+                finished_idx = idx[finished]
+                end_step = state["end_step"][finished]
+                self.pull_count += int(end_step.sum())
+
+                self._credit_four_stars(state, finished_rows, end_step)
+
+                currency[finished_idx] = state["currency"][finished]
+                self.accounts.jewels[finished_idx] = state["jewels"][finished]
+                self.accounts.conigems[finished_idx] = state["conigems"][finished]
+                pity[finished_idx] = state["pity_base"][finished] + end_step - state["pity_step"][finished]
+                counter_4star[finished_idx] = state["counter_base"][finished] + end_step - state["counter_step"][finished]
+
+                if self.lowest_wealth is not None:
+                    currency_used = state["start_currency"][finished] - state["currency"][finished]
+                    self._track_lowest_wealth(finished_idx, end_step - currency_used, counter_4star)
+
+                idx = idx[~finished]
+                state = {key: values[~finished] for key, values in state.items()}
+
+        return success
+
+
+    def _track_lowest_wealth(self, finished_idx, jewel_pulls, counter_4star):
+        """
+        Record the jewel value the finished runs had left right after paying for their last jewel paid pull.
+
+        :param finished_idx: Indices of the runs that finished a pull sequence
+        :param jewel_pulls: Number of pulls each of them paid with jewels in this sequence
+        :param counter_4star: 4-star counter array of the banner, already updated for the finished runs
+        """
+        paid = finished_idx[jewel_pulls > 0]
+
+        wealth = self.accounts.jewels[paid].astype(np.int64) + self.accounts.conigems[paid] * CONIGEM_WEALTH
+
+        # A 4-star on the last pull was only credited after paying for it
+        wealth -= CONIGEM_JEWEL_VALUE * (counter_4star[paid] == 0)
+
+        self.lowest_wealth[paid] = np.minimum(self.lowest_wealth[paid], wealth)
+
+
+    @staticmethod
+    def _credit_four_stars(state, rows, step):
+        """
+        Credit the conigems of every 4-star the given rows pulled up to and including step.
+        """
+        four_star_at = state["four_star_at"][rows]
+        triggers = np.maximum((step - four_star_at) // FOUR_STAR_INTERVAL + 1, 0)
+        triggered = triggers > 0
+        last_trigger = four_star_at + (triggers - 1) * FOUR_STAR_INTERVAL
+
+        state["conigems"][rows] += triggers * CONIGEM_CONVERSION_RATE
+        state["counter_base"][rows] = np.where(triggered, 0, state["counter_base"][rows])
+        state["counter_step"][rows] = np.where(triggered, last_trigger, state["counter_step"][rows])
+        state["four_star_at"][rows] = four_star_at + triggers * FOUR_STAR_INTERVAL
+
+
+    def _draw_next_hit(self, step, runs, rate):
+        """
+        Draw the step of the next natural featured hit for the given runs, inverting the geometric distribution
+        of one uniform number of each run's stream.
+
+        :param step: Current step
+        :param runs: Array of the run indices to draw for
+
+        Returns:
+            Array of absolute step indices, never reached if the rate is zero
+        """
+        if rate <= 0:
+            return np.full(runs.size, NEVER, dtype=np.int64)
+
+        self.rng_draws += runs.size
+        uniform = self.streams.uniform(runs)
+
+        return step + np.floor(np.log1p(-uniform) / math.log1p(-rate)).astype(np.int64) + 1
+
+
+    @staticmethod
+    def _settle(state, rows, step, jewel_cost):
+        """
+        Pay for the pulls the given rows made since their last settlement, tickets/coins first and jewels
+        for the rest.
+        """
+        pulls = step - state["settled"][rows]
+        from_currency = np.minimum(state["currency"][rows], pulls)
+
+        state["currency"][rows] -= from_currency
+        state["jewels"][rows] -= (pulls - from_currency) * jewel_cost
+        state["settled"][rows] = step
+
+
+    @staticmethod
+    def _count_successive_pulls(pull, mask, attempts):
+        """
+        Repeat a pull up to attempts times, each run stopping at its first failure.
+
+        Returns:
+            Per-run array with the number of successful pulls
+        """
+        obtained = np.zeros(mask.size, dtype=np.int64)
+        still_pulling = mask
+
+        for _ in range(attempts):
+            still_pulling = pull(still_pulling)
+            obtained += still_pulling
+
+        return obtained
+
+
+    @staticmethod
+    def _count_failure(aggregate, key, failed, obtained=None, needed=None):
+        obtained_histogram = None
+
+        if obtained is not None:
+            obtained_histogram = np.bincount(obtained[failed], minlength=needed + 1).tolist()
+
+        aggregate.add_failures(key, np.count_nonzero(failed), needed, obtained_histogram)
@@ -0,0 +1,57 @@
+import copy
+import numpy as np
+from src.core.batch_engine import BatchEngine
+from src.core.confidence_interval import wilson_interval
+from src.core.worker_pool import get_worker_pool
+from src.model.enum.engine_type import EngineType
+
+
+def find_required_jewels(simulator, target_success_rate, max_runs=None):
+    """
+    Find the smallest number of starting jewels with which the plan succeeds at the target rate.
+
+    Instead of searching over jewel amounts, every run is simulated once with an unlimited budget while recording
+    how many starting jewels it needed. The success rate for any jewel amount is then the share of runs that needed
+    at most that many, so the answer is a quantile of this distribution and costs about one forecast.
+    Always uses the batch engine, other simulator settings apply as usual.
+
+    :param simulator: Simulator configured with the plan and every input but the jewels to find
+    :param target_success_rate: Required success rate in percent
+    :param max_runs: Number of runs, defaults to NUM_SIMULATIONS
+
+    Returns:
+        Dictionary with required_jewels, additional_jewels (on top of the simulator's current jewels),
+        target_success_rate, the success_rate and confidence_interval reached with required_jewels,
+        total_runs and seed
+    """
+    if not 0 < target_success_rate <= 100:
+        raise ValueError("Target success rate must be above 0% and at most 100%")
+
+    # Chunked like a batch forecast whatever engine the simulator was configured with
+    simulator = copy.copy(simulator)
+    simulator.engine_type = EngineType.BATCH
+    simulator.plan = simulator.compile_plan()
+    chunks = simulator.plan_chunks(max_runs)
+
+    required = np.concatenate(get_worker_pool().run_tasks(
+        required_jewels_in_worker,
+        [(simulator, chunk_runs, chunk_seed) for chunk_runs, chunk_seed in chunks]
+    ))
+
+    required_jewels = int(np.quantile(required, target_success_rate / 100, method="inverted_cdf"))
+    successful_runs = int(np.count_nonzero(required <= required_jewels))
+    lower, upper = wilson_interval(successful_runs, required.size)
+
+    return {
+        "required_jewels": required_jewels,
+        "additional_jewels": max(required_jewels - simulator.account.current_jewels, 0),
+        "target_success_rate": target_success_rate,
+        "success_rate": successful_runs / required.size * 100,
+        "confidence_interval": (lower * 100, upper * 100),
+        "total_runs": int(required.size),
+        "seed": simulator.seed
+    }
+
+
+def required_jewels_in_worker(simulator, num_runs, seed):
+    return BatchEngine(simulator, seed).required_jewels(num_runs)
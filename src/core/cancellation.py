@@ -0,0 +1,36 @@
+import threading
+
+
+class SimulationCancelled(Exception):
+    """
+    Raised by a forecast whose cancellation token was cancelled.
+    """
+
+
+class CancellationToken:
+    """
+    Thread-safe flag a running forecast checks between chunks.
+
+    The GUI thread cancels, the simulation thread notices it at its next check and raises SimulationCancelled.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+
+
+    def cancel(self):
+        self._event.set()
+
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+
+    def raise_if_cancelled(self):
+        """
+        Raises:
+            SimulationCancelled if the token was cancelled
+        """
+        if self._event.is_set():
+            raise SimulationCancelled()
@@ -0,0 +1,53 @@
+import math
+
+# Two-sided 95% confidence
+Z_95 = 1.959963984540054
+
+
+def wilson_interval(successes, trials, z=Z_95):
+    """
+    Wilson score interval of a binomial proportion.
+
+    :param successes: Number of successful trials
+    :param trials: Total number of trials
+    :param z: Standard normal quantile of the desired confidence level
+
+    Returns:
+        Tuple of (lower, upper) bounds as fractions between 0 and 1
+    """
+    if trials == 0:
+        return 0.0, 1.0
+
+    p = successes / trials
+    z_squared = z * z
+    denominator = 1 + z_squared / trials
+
+    center = (p + z_squared / (2 * trials)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / trials + z_squared / (4 * trials * trials)) / denominator
+
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+
+def paired_difference_interval(gains, losses, trials, z=Z_95):
+    """
+    Normal approximation interval of the difference between two success rates measured on the same trials.
+
+    Only trials where exactly one of the two succeeded carry information about the difference, which is why
+    pairing both on common random numbers needs far fewer trials than comparing two independent samples.
+
+    :param gains: Number of trials where only the second succeeded
+    :param losses: Number of trials where only the first succeeded
+    :param trials: Total number of paired trials
+    :param z: Standard normal quantile of the desired confidence level
+
+    Returns:
+        Tuple of (lower, upper) bounds of the second rate minus the first, as fractions between -1 and 1
+    """
+    if trials == 0:
+        return -1.0, 1.0
+
+    difference = (gains - losses) / trials
+    variance = max((gains + losses) / trials - difference * difference, 0.0)
+    margin = z * math.sqrt(variance / trials)
+
+    return max(-1.0, difference - margin), min(1.0, difference + margin)
@@ -0,0 +1,32 @@
+PATCH_DURATION_DAYS = 14
+
+# Income Constants
+MONTHLY_SUB_BONUS = 300
+BP_JEWEL_BONUS = 650
+BP_PLAT_TICKETS = 3
+BP_PLAT_COINS = 7
+
+SMALL_PATCH_JEWELS = 6000
+BIG_PATCH_JEWELS = 10000
+
+# Gacha Constants
+CHAR_RATE_TARGETED = 0.004
+CHAR_PITY_TARGETED = 110
+
+CHAR_RATE_CHANCE = 0.008
+CHAR_PITY_CHANCE = 80
+
+WEAPON_RATE = 0.008
+WEAPON_PITY = 70
+
+CHAR_JEWEL_COST = 150
+WEAPON_JEWEL_COST = 100
+
+# Violet Conigem Constants
+CONIGEM_CONVERSION_RATE = 10
+CONIGEM_JEWEL_VALUE = 100
+
+# Jewel value of a single violet conigem
+CONIGEM_WEALTH = CONIGEM_JEWEL_VALUE // CONIGEM_CONVERSION_RATE
+
+FOUR_STAR_INTERVAL = 10
@@ -0,0 +1,883 @@
+import math
+import numpy as np
+from src.model.enum.banner_type import BannerType
+from src.model.simulation_aggregate import SimulationAggregate
+from src.core.pull_tables import pulls_to_hit_cdf
+from src.core.constants import (
+    CHAR_RATE_TARGETED, CHAR_PITY_TARGETED, CHAR_RATE_CHANCE, CHAR_PITY_CHANCE, WEAPON_RATE, WEAPON_PITY,
+    CHAR_JEWEL_COST, WEAPON_JEWEL_COST, CONIGEM_JEWEL_VALUE, CONIGEM_WEALTH, FOUR_STAR_INTERVAL
+)
+
+# Largest number of distinct states the solver keeps before giving up on a plan. Past about this many, sampling
+# NUM_SIMULATIONS runs with the batch engine is faster
+MAX_STATES = 500_000
+
+# Wealth only ever changes in multiples of this, apart from income that every state receives alike
+WEALTH_STEP = math.gcd(CHAR_JEWEL_COST, WEAPON_JEWEL_COST, CONIGEM_JEWEL_VALUE)
+
+# Grouping states counts their packed keys in a table when it is at most this many times larger than the states
+GROUP_TABLE_FACTOR = 8
+
+# Entries of the dense wealth rows the hits of a pity cycle are worked out in at once
+HIT_BLOCK_ENTRIES = 2_000_000
+
+STATE_COLUMNS = (
+    "wealth", "tickets", "coins", "char_pity", "weapon_pity", "char_mixture", "weapon_mixture", "char_4star",
+    "weapon_4star", "all_succeeded"
+)
+
+# Columns only read by character or weapon pulls
+CHAR_COLUMNS = ("tickets", "char_pity", "char_mixture", "char_4star")
+WEAPON_COLUMNS = ("coins", "weapon_pity", "weapon_mixture", "weapon_4star")
+
+
+class PlanTooLargeError(ValueError):
+    """
+    Raised when a plan needs more than MAX_STATES states, Simulator.solve_exact falls back to sampling on it.
+    """
+
+
+class ExactEngine:
+    """
+    Exact Markov chain solver.
+
+    Instead of sampling runs, propagates the probability distribution over account states pity cycle by pity cycle
+    and merges identical states, so success rates and failure probabilities carry no Monte Carlo noise.
+
+    Conigems are always earned in multiples of ten and converted without loss as soon as jewels run short,
+    so a pull is affordable exactly when jewels plus the jewel value of all conigems cover it. The state
+    therefore tracks this combined wealth instead of jewels and conigems separately.
+
+    While one banner type is pulled on, the pity the other one was left at only matters for its next cycle. States
+    that agree on everything else are folded into one whose pity column refers to a mixture, the distribution of
+    their pities, instead of keeping a state per pity next to every wealth level the pulls spread them over.
+
+    The number of states mostly grows with the wealth levels below the wealth caps, times the 4-star counters. Runs
+    that ran dry keep their pity until they pull on that banner type again, which multiplies the states by up to the
+    hard pity where that pity differs from one wealth level to the next. Plans that need more than MAX_STATES states
+    raise PlanTooLargeError, up front when estimate_states predicts it and otherwise once a merge exceeds the limit.
+    Simulator.solve_exact then forecasts them with the batch engine instead.
+    """
+
+    def __init__(self, simulator):
+        """
+        Initialize the engine for the given simulator configuration.
+
+        :param simulator: Simulator holding the account, banner configs, banner type and luck modifier
+        """
+        self.simulator = simulator
+
+        if simulator.banner_type == BannerType.CHANCE:
+            self.char_rate = CHAR_RATE_CHANCE * simulator.luck_mod
+            self.char_pity_cap = CHAR_PITY_CHANCE
+            self.char_fifty_fifty = True
+        else:
+            self.char_rate = CHAR_RATE_TARGETED * simulator.luck_mod
+            self.char_pity_cap = CHAR_PITY_TARGETED
+            self.char_fifty_fifty = False
+
+        self.weapon_rate = WEAPON_RATE * simulator.luck_mod
+
+        # Probability of losing a 50/50, the reference engine loses when a uniform draw is >= 0.5 * luck_mod
+        self.lose_chance = 1.0 - 0.5 * simulator.luck_mod
+
+        self.pity_caps = {"char_pity": self.char_pity_cap, "weapon_pity": WEAPON_PITY}
+        self.cycle_tables = {
+            "char_pity": _cycle_tables(self.char_rate, self.char_pity_cap),
+            "weapon_pity": _cycle_tables(self.weapon_rate, WEAPON_PITY)
+        }
+
+        # Pity distributions referred to by the mixture columns, id 0 stands for the exact pity in the pity column
+        self.mixtures = {pity: np.zeros((1, pity_cap)) for pity, pity_cap in self.pity_caps.items()}
+        self.mixture_ids = {pity: {} for pity in self.pity_caps}
+
+
+    def run(self):
+        """
+        Solve the plan exactly.
+
+        Raises:
+            PlanTooLargeError if the plan needs more than MAX_STATES states, up front if estimate_states predicts it
+
+        Returns:
+            SimulationAggregate whose run and failure counts are probabilities of a single run
+        """
+        if self.estimate_states() > MAX_STATES:
+            raise PlanTooLargeError("Plan is too large for the exact solver")
+
+        account = self.simulator.account
+
+        dist = {
+            "prob": np.ones(1),
+            "wealth": np.array([account.current_jewels + account.violet_conigems * CONIGEM_WEALTH], dtype=np.int64),
+            "tickets": np.array([account.owned_plat_tickets], dtype=np.int64),
+            "coins": np.array([account.owned_plat_coins], dtype=np.int64),
+            "char_pity": np.array([account.current_character_pity], dtype=np.int64),
+            "weapon_pity": np.array([account.current_weapon_pity], dtype=np.int64),
+            "char_mixture": np.zeros(1, dtype=np.int64),
+            "weapon_mixture": np.zeros(1, dtype=np.int64),
+            "char_4star": np.array([account.char_pulls_since_4star], dtype=np.int64),
+            "weapon_4star": np.array([account.weapon_pulls_since_4star], dtype=np.int64),
+            "all_succeeded": np.ones(1, dtype=np.int64)
+        }
+
+        aggregate = SimulationAggregate()
+        char_pulls_after, weapon_pulls_after = self._pulls_after()
+        wealth_caps = self._wealth_caps()
+
+        for idx, target in enumerate(self.simulator.plan):
+            dist["wealth"] += target.jewels
+            dist["tickets"] += target.tickets
+            dist["coins"] += target.coins
+
+            # Tickets and coins go before jewels, once the other banner is never pulled on again they are as good as
+            # jewels
+            if not target.pull_weapon and not target.refinement and not weapon_pulls_after[idx]:
+                self._fold_currency(dist, "tickets", CHAR_JEWEL_COST)
+
+            # Wealth past what the rest of the plan can cost never runs dry, so its exact amount no longer matters
+            wealth_cap = wealth_caps[idx] + (int(dist["wealth"][0]) - wealth_caps[idx]) % WEALTH_STEP
+            dist["wealth"] = np.minimum(dist["wealth"], wealth_cap)
+
+            dist = self._process_banner(dist, aggregate, target, char_pulls_after[idx], weapon_pulls_after[idx])
+
+        aggregate.add_runs(1.0, float(dist["prob"][dist["all_succeeded"] == 1].sum()))
+
+        return aggregate
+
+
+    def estimate_states(self):
+        """
+        Estimate of the largest number of distinct states the plan needs, cheap enough to check up front.
+
+        Follows the columns that multiply the number of states at the start of every banner. Wealth takes a level per
+        WEALTH_STEP up to the banner's wealth cap, tickets and coins are spent before jewels, so they add levels
+        rather than multiplying them. Each banner type with pulls both behind and ahead keeps its 4-star counter, and
+        from the second banner on the runs that already failed are told apart from the rest. Pities hardly add to
+        this, a hit resets them and the pity of the banner type not pulled on is folded into mixtures.
+
+        Returns:
+            Estimated number of states, 1 with worst luck where every run is the same
+        """
+        if self.simulator.luck_mod == 0.0:
+            return 1
+
+        account = self.simulator.account
+        wealth = account.current_jewels + account.violet_conigems * CONIGEM_WEALTH
+        tickets = account.owned_plat_tickets
+        coins = account.owned_plat_coins
+
+        _, weapon_pulls_after = self._pulls_after()
+        wealth_caps = self._wealth_caps()
+        weapon_pulled = False
+        largest = 1
+
+        for idx, target in enumerate(self.simulator.plan):
+            wealth += target.jewels
+            tickets += target.tickets
+            coins += target.coins
+
+            pulls_weapon = target.pull_weapon or target.refinement > 0
+            weapon_pulled = weapon_pulled or pulls_weapon
+            counters = 2 if weapon_pulled and (pulls_weapon or weapon_pulls_after[idx]) else 1
+
+            levels = min(wealth, wealth_caps[idx]) // WEALTH_STEP + 1 + tickets + coins
+            largest = max(largest, levels * FOUR_STAR_INTERVAL ** counters * (2 if idx else 1))
+
+        return largest
+
+
+    def _wealth_caps(self):
+        """
+        Find out for every pull target how much wealth is enough to never run dry again, however unlucky the pulls.
+
+        Returns:
+            List of wealth amounts right after the target's income, one entry per pull target
+        """
+        plan = self.simulator.plan
+        char_copy_cost = (2 if self.char_fifty_fifty else 1) * self.char_pity_cap * CHAR_JEWEL_COST
+        weapon_copy_cost = 2 * WEAPON_PITY * WEAPON_JEWEL_COST
+
+        wealth_caps = [0] * len(plan)
+        needed_after = 0
+
+        for idx in reversed(range(len(plan))):
+            target = plan[idx]
+            # The character step pulls awareness + 1 copies and the duplicates step another awareness
+            wealth_caps[idx] = ((2 * target.awareness + 1) * char_copy_cost
+                                + (target.pull_weapon + target.refinement) * weapon_copy_cost + needed_after)
+            needed_after = max(wealth_caps[idx] - target.jewels, 0)
+
+        return wealth_caps
+
+
+    def _pulls_after(self):
+        """
+        Find out for every pull target whether any later one still pulls on the character or weapon banner.
+
+        Returns:
+            Tuple of two lists of booleans, one entry per pull target
+        """
+        plan = self.simulator.plan
+
+        char_pulls_after = [False] * len(plan)
+        weapon_pulls_after = [False] * len(plan)
+        weapon_pulls = False
+
+        for idx in reversed(range(len(plan))):
+            char_pulls_after[idx] = idx < len(plan) - 1
+            weapon_pulls_after[idx] = weapon_pulls
+            weapon_pulls = weapon_pulls or plan[idx].pull_weapon or plan[idx].refinement > 0
+
+        return char_pulls_after, weapon_pulls_after
+
+
+    def _process_banner(self, dist, aggregate, target, char_pulls_after, weapon_pulls_after):
+        """
+        Apply one selected banner to the distribution, following the same order as Simulator._run.
+        Per-banner progress is tracked in extra columns that are dropped again once the banner is done.
+
+        Character and weapon state that no later pull reads is cleared as soon as possible, so states that only differ
+        in it merge. Otherwise the number of states grows with the product of both banners' pity and 4-star counters.
+        """
+        patch_version = target.patch_version
+        char_name = target.featured_character
+        awareness = target.awareness
+        refinement = target.refinement
+        pull_weapon = target.pull_weapon
+
+        size = dist["prob"].size
+        dist["char_success"] = np.ones(size, dtype=np.int64)
+
+        # Runs failing the character or weapon step skip the rest of the banner, only later banners read their state
+        skipped_columns = ((CHAR_COLUMNS if not char_pulls_after else ())
+                           + (WEAPON_COLUMNS if not weapon_pulls_after else ()))
+
+        for _ in range(awareness + 1):
+            dist = self._pull_character(dist, "char_success", skipped_columns)
+
+        self._add_failure(aggregate, (patch_version, "character", char_name), dist, dist["char_success"] == 0)
+
+        if not awareness and not char_pulls_after:
+            self._fold_currency(dist, "coins", WEAPON_JEWEL_COST)
+            self._forget(dist, CHAR_COLUMNS)
+
+        if pull_weapon:
+            dist["weapon_success"] = dist["char_success"].copy()
+            dist = self._pull_weapon(dist, "weapon_success", skipped_columns)
+
+            self._add_failure(aggregate, (patch_version, "weapon", char_name), dist,
+                              (dist["char_success"] == 1) & (dist["weapon_success"] == 0))
+            dist["proceed"] = dist["weapon_success"].copy()
+        else:
+            dist["weapon_success"] = np.zeros(dist["prob"].size, dtype=np.int64)
+            dist["proceed"] = dist["char_success"].copy()
+
+        if not refinement and not weapon_pulls_after:
+            self._fold_currency(dist, "tickets", CHAR_JEWEL_COST)
+            self._forget(dist, WEAPON_COLUMNS)
+
+        dist["duplicates"] = np.zeros(dist["prob"].size, dtype=np.int64)
+        dist["pulling"] = dist["proceed"].copy()
+
+        for _ in range(awareness):
+            dist = self._pull_character(dist, "pulling", CHAR_COLUMNS if not char_pulls_after else ())
+            dist["duplicates"] += dist["pulling"]
+
+        if not char_pulls_after:
+            self._fold_currency(dist, "coins", WEAPON_JEWEL_COST)
+            self._forget(dist, CHAR_COLUMNS)
+
+        dist["refinements"] = np.zeros(dist["prob"].size, dtype=np.int64)
+        dist["pulling"] = dist["proceed"].copy()
+
+        for _ in range(refinement):
+            dist = self._pull_weapon(dist, "pulling", WEAPON_COLUMNS if not weapon_pulls_after else ())
+            dist["refinements"] += dist["pulling"]
+
+        awareness_failed = (dist["proceed"] == 1) & (dist["duplicates"] < awareness)
+        self._add_failure(aggregate, (patch_version, "awareness", char_name), dist,
+                          awareness_failed, "duplicates", awareness)
+
+        refinement_failed = (dist["weapon_success"] == 1) & (dist["refinements"] < refinement)
+        self._add_failure(aggregate, (patch_version, "refinement", char_name), dist,
+                          refinement_failed, "refinements", refinement)
+
+        char_obtained = (dist["char_success"] == 1) & ~awareness_failed
+        banner_succeeded = char_obtained
+
+        if pull_weapon:
+            banner_succeeded = banner_succeeded & (dist["weapon_success"] == 1) & ~refinement_failed
+
+        dist["all_succeeded"] &= banner_succeeded
+
+        if not weapon_pulls_after:
+            self._forget(dist, WEAPON_COLUMNS)
+
+        return self._merge({column: dist[column] for column in ("prob",) + STATE_COLUMNS})
+
+
+    def _pull_character(self, dist, flag, dry_forgotten):
+        dist = self._fold_pity(dist, flag, "weapon_pity", "weapon_mixture")
+
+        return self._pull_until_featured(
+            dist, flag, dry_forgotten, "tickets", "char_pity", "char_mixture", "char_4star",
+            CHAR_JEWEL_COST, self.char_pity_cap, self.char_fifty_fifty
+        )
+
+
+    def _pull_weapon(self, dist, flag, dry_forgotten):
+        dist = self._fold_pity(dist, flag, "char_pity", "char_mixture")
+
+        return self._pull_until_featured(
+            dist, flag, dry_forgotten, "coins", "weapon_pity", "weapon_mixture", "weapon_4star",
+            WEAPON_JEWEL_COST, WEAPON_PITY, True
+        )
+
+
+    def _fold_pity(self, dist, flag, pity, mixture):
+        """
+        Fold the pity of the banner type the flagged states are not pulling on into mixtures. States that only differ
+        in it become one, whose pity the mixture column refers to.
+
+        :param dist: Distribution as a dictionary of equally long column arrays plus their probabilities
+        :param flag: Name of the column marking the states that pull
+        :param pity: Name of the other banner's pity column
+        :param mixture: Name of the other banner's mixture column
+
+        Returns:
+            The new distribution
+        """
+        folding = (dist[flag] == 1) & ((dist[pity] != 0) | (dist[mixture] != 0))
+
+        if not folding.any():
+            return dist
+
+        kept = self._select(dist, ~folding)
+        folding = self._select(dist, folding)
+
+        columns = [column for column in folding if column not in ("prob", pity, mixture)]
+        inverse, num_states, unique_values = _group_states([folding[column] for column in columns])
+
+        pity_cap = self.pity_caps[pity]
+        weights = np.zeros((num_states, pity_cap))
+        exact = folding[mixture] == 0
+
+        np.add.at(weights, (inverse[exact], np.minimum(folding[pity][exact], pity_cap - 1)), folding["prob"][exact])
+        np.add.at(weights, inverse[~exact],
+                  folding["prob"][~exact, None] * self.mixtures[pity][folding[mixture][~exact]])
+
+        folded = dict(zip(columns, unique_values))
+        folded["prob"] = weights.sum(axis=1)
+        folded[pity], folded[mixture] = self._add_mixtures(pity, weights / folded["prob"][:, None])
+
+        return self._concat([kept, folded])
+
+
+    def _add_mixtures(self, pity, mixtures):
+        """
+        Look up or register pity distributions. Distributions of a single pity need no mixture.
+
+        :param pity: Name of the pity column the distributions belong to
+        :param mixtures: 2D array with a distribution over the pities below hard pity per row
+
+        Returns:
+            Tuple of the pity and mixture column values standing for the distributions
+        """
+        single = np.count_nonzero(mixtures, axis=1) == 1
+        pities = np.where(single, mixtures.argmax(axis=1), 0)
+        mixture_ids = np.zeros(pities.size, dtype=np.int64)
+
+        known = self.mixture_ids[pity]
+        added = []
+
+        for row in np.flatnonzero(~single).tolist():
+            key = mixtures[row].tobytes()
+
+            if key not in known:
+                known[key] = len(known) + 1
+                added.append(mixtures[row])
+
+            mixture_ids[row] = known[key]
+
+        if added:
+            self.mixtures[pity] = np.concatenate([self.mixtures[pity], added])
+
+        return pities, mixture_ids
+
+
+    def _pull_until_featured(self, dist, flag, dry_forgotten, currency, pity, mixture, counter_4star, jewel_cost,
+                             pity_cap, fifty_fifty):
+        """
+        Propagate the distribution through one "pull until the featured unit" call for the states whose flag
+        column is set. The flag is cleared for states that run out of currency.
+
+        :param dist: Distribution as a dictionary of equally long column arrays plus their probabilities
+        :param flag: Name of the column marking the states that pull
+        :param dry_forgotten: Columns no later pull of a state that runs out of currency reads, cleared for them
+                              before they are merged
+        :param currency: Name of the banner specific currency column
+        :param pity: Name of the banner's pity column
+        :param mixture: Name of the banner's mixture column
+        :param counter_4star: Name of the banner's 4-star counter column
+        :param jewel_cost: Jewel cost of a single pull
+        :param pity_cap: Hard pity of this banner
+        :param fifty_fifty: Whether the featured unit is subject to a 50/50
+
+        Returns:
+            The new distribution
+        """
+        pulling = dist[flag] == 1
+
+        if not pulling.any():
+            return dist
+
+        idle = self._select(dist, ~pulling)
+
+        # Columns the pulls do not touch are replaced by the index of their unique combination while pulling,
+        # which keeps the arrays shuffled around per pull narrow
+        own_columns = ("wealth", currency, pity, mixture, counter_4star)
+        passive_columns = [column for column in dist if column not in own_columns + ("prob", flag)]
+
+        pullers = self._select(dist, pulling)
+        passive_index, _, passive_values = _group_states([pullers[column] for column in passive_columns])
+
+        # The same combinations for states that run dry, whose forgotten columns are cleared right away. Otherwise
+        # they would keep the other banner's pity and 4-star counter next to their own until the banner ends
+        dry_passive_index, _, dry_passive_values = _group_states([
+            np.zeros_like(values) if column in dry_forgotten else values
+            for column, values in zip(passive_columns, passive_values)
+        ])
+        dry_own_forgotten = [column for column in own_columns if column in dry_forgotten]
+
+        active = {column: pullers[column] for column in ("prob",) + own_columns}
+        active["passive"] = passive_index
+        active["guaranteed"] = np.zeros(active["prob"].size, dtype=np.int64)
+
+        out_of_funds, won = [], []
+
+        # One pity cycle per round, a lost 50/50 leaves its states guaranteed for a second round
+        while active["prob"].size:
+            hit, dry = self._pity_cycle(active, currency, pity, mixture, counter_4star, jewel_cost, pity_cap)
+            dry["passive"] = dry_passive_index[dry["passive"]]
+            self._forget(dry, dry_own_forgotten)
+
+            out_of_funds.append(self._merge(dry))
+            won.append(hit)
+
+            if not fifty_fifty:
+                break
+
+            contested = hit["guaranteed"] == 0
+
+            lost = self._select(hit, contested)
+            lost["prob"] *= self.lose_chance
+            lost["guaranteed"][:] = 1
+
+            hit["prob"][contested] *= 1.0 - self.lose_chance
+            active = self._merge(lost)
+
+        parts = [idle]
+
+        for finished, flag_value, values_of_passive in ((out_of_funds, 0, dry_passive_values),
+                                                        (won, 1, passive_values)):
+            if not finished:
+                continue
+
+            finished = self._concat(finished)
+            del finished["guaranteed"]
+            finished = self._merge(finished)
+
+            passive_index = finished.pop("passive")
+            finished[flag] = np.full(passive_index.size, flag_value, dtype=np.int64)
+
+            for column, values in zip(passive_columns, values_of_passive):
+                finished[column] = values[passive_index]
+
+            parts.append(finished)
+
+        return self._merge(self._concat(parts))
+
+
+    def _pity_cycle(self, dist, currency, pity, mixture, counter_4star, jewel_cost, pity_cap):
+        """
+        Propagate states through one pity cycle, pulling until the next 5-star or until they run dry.
+
+        Up to the 5-star a cycle holds no randomness: the banner currency is spent before jewels and a 4-star refunds
+        conigems every FOUR_STAR_INTERVAL pulls, so the number of pulls a state can afford follows from the state.
+        Only the length of the cycle is random, distributed as in the pulls_to_hit_cdf table of the state's pity,
+        or as the mix of those tables given by its mixture.
+
+        How much wealth each pull needs and what a hit leaves behind only depend on the banner currency and 4-star
+        counter, so they are worked out once per combination of the two rather than per state.
+
+        Returns:
+            Tuple of the distributions of the states that hit, with their pity reset and merged, and of the states
+            that ran dry
+        """
+        hit_before_hard, hit_on_hard, survival = self.cycle_tables[pity]
+        untouched = [column for column in dist if column not in ("prob", "wealth", currency, pity, mixture,
+                                                                 counter_4star)]
+
+        # Every state starts from a known pity or a mixture, either way a distribution over the pities
+        sources, source_index = np.unique(dist[mixture] * pity_cap + np.minimum(dist[pity], pity_cap - 1),
+                                          return_inverse=True)
+        source_mixtures, source_pities = np.divmod(sources, pity_cap)
+        start = self.mixtures[pity][source_mixtures]
+        start[source_mixtures == 0, source_pities[source_mixtures == 0]] = 1.0
+
+        source_cycle_pulls = pity_cap - (start > 0.0).argmax(axis=1)
+        cycle_pulls = source_cycle_pulls[source_index]
+        max_pulls = int(source_cycle_pulls.max())
+        pulls = np.arange(1, max_pulls + 1)
+
+        classes, class_index = np.unique(dist[currency] * FOUR_STAR_INTERVAL + dist[counter_4star],
+                                         return_inverse=True)
+        currency_held, counter = np.divmod(classes[:, None], FOUR_STAR_INTERVAL)
+
+        # Wealth needed for every pull, refunds of the 4-stars of all earlier pulls of the cycle included. Wealth only
+        # goes down once the currency is gone, so a state affords every pull up to the first one it cannot pay for
+        needed = np.where(pulls > currency_held, jewel_cost * (pulls - currency_held)
+                          - CONIGEM_JEWEL_VALUE * ((counter + pulls - 1) // FOUR_STAR_INTERVAL), -1)
+        needed = np.maximum.accumulate(np.maximum(needed, -1), axis=1)
+
+        # Offsetting every class's row past the wealth of all others sorts the needed wealth into a single array
+        offset = max(int(dist["wealth"].max()), int(needed.max())) + 2
+        affordable_pulls = (np.searchsorted((needed + 1 + offset * np.arange(classes.size)[:, None]).ravel(),
+                                            dist["wealth"] + 1 + offset * class_index, side="right")
+                            - max_pulls * class_index)
+        affordable_pulls = np.minimum(affordable_pulls, cycle_pulls)
+
+        # A 4-star due on the hard pity pull comes with the next pull instead. Leaving the counter one short of the
+        # interval hands it out on that pull just the same, and merges with states that got there without the delay
+        counter_after = counter + pulls
+        currency_after = np.maximum(currency_held - pulls, 0) * FOUR_STAR_INTERVAL
+        transitions = {
+            "due": counter_after % FOUR_STAR_INTERVAL == 0,
+            "hit_classes": currency_after + counter_after % FOUR_STAR_INTERVAL,
+            "delayed_classes": np.broadcast_to(currency_after + FOUR_STAR_INTERVAL - 1, counter_after.shape),
+            "level_changes": (CONIGEM_JEWEL_VALUE * (counter_after // FOUR_STAR_INTERVAL)
+                              - jewel_cost * np.maximum(pulls - currency_held, 0)) // WEALTH_STEP
+        }
+
+        hit = self._cycle_hits(dist, untouched, class_index, source_index, transitions,
+                               start @ hit_before_hard[:, :max_pulls], start @ hit_on_hard[:, :max_pulls],
+                               source_cycle_pulls)
+        hit[currency], hit[counter_4star] = np.divmod(hit.pop("class"), FOUR_STAR_INTERVAL)
+        hit[pity] = np.zeros(hit["prob"].size, dtype=np.int64)
+        hit[mixture] = np.zeros(hit["prob"].size, dtype=np.int64)
+
+        dry_rows = np.flatnonzero(affordable_pulls < cycle_pulls)
+        dry_pulls = affordable_pulls[dry_rows]
+
+        # Pities still short of a hit after the pulls a state affords, weighted by how likely they got that far
+        dry_sources, dry_index = np.unique(source_index[dry_rows] * pity_cap + dry_pulls, return_inverse=True)
+        dry_source_index, dry_source_pulls = np.divmod(dry_sources, pity_cap)
+
+        remaining = start[dry_source_index] * survival[:, dry_source_pulls].T
+        survived = remaining.sum(axis=1)
+        shifted = np.zeros_like(remaining)
+
+        for row, pulls_done in enumerate(dry_source_pulls.tolist()):
+            shifted[row, pulls_done:] = remaining[row, :pity_cap - pulls_done]
+
+        dry_pities, dry_mixtures = self._add_mixtures(pity, shifted / survived[:, None])
+
+        dry = {column: values[dry_rows] for column, values in dist.items()}
+        dry["prob"] = dry["prob"] * survived[dry_index]
+
+        counter_after = dry[counter_4star] + dry_pulls
+        dry["wealth"] = (dry["wealth"] + CONIGEM_JEWEL_VALUE * (counter_after // FOUR_STAR_INTERVAL)
+                         - jewel_cost * np.maximum(dry_pulls - dry[currency], 0))
+        dry[currency] = np.maximum(dry[currency] - dry_pulls, 0)
+        dry[counter_4star] = counter_after % FOUR_STAR_INTERVAL
+        dry[pity] = dry_pities[dry_index]
+        dry[mixture] = dry_mixtures[dry_index]
+
+        return hit, dry
+
+
+    def _cycle_hits(self, dist, untouched, class_index, source_index, transitions, before_hard, on_hard,
+                    source_cycle_pulls):
+        """
+        Distribution of the states that hit during a pity cycle, with the currency and 4-star counter still packed
+        into the class column.
+
+        A hit on pull k moves a state's wealth by the same amount for every state of its class, so the hits of a
+        group of states that share their class, pity source and untouched columns are a sum of shifted copies of the
+        group's wealth distribution, weighted by the chances to hit on each pull. Whether the state could pay for
+        pull k shows in the wealth it is left with: nothing below zero, or below the refund when pull k came with a
+        4-star. The groups are therefore laid out as dense rows over their wealth levels and shifted pull by pull,
+        in blocks of at most HIT_BLOCK_ENTRIES entries.
+
+        :param dist: Distribution of the states entering the cycle
+        :param untouched: Columns the cycle leaves as they are
+        :param class_index: Class of every state
+        :param source_index: Pity source of every state
+        :param transitions: Per class and pull, whether a 4-star is due, the classes after a hit and after one with
+                            a delayed 4-star, and the change in wealth levels
+        :param before_hard: Chances of every pity source to hit on each pull before hard pity
+        :param on_hard: Chances of every pity source to hit on the hard pity pull
+        :param source_cycle_pulls: Longest cycle of every pity source
+
+        Returns:
+            The merged distribution of the states that hit
+        """
+        refund_levels = CONIGEM_JEWEL_VALUE // WEALTH_STEP
+
+        base = int(dist["wealth"].min())
+        levels = (dist["wealth"] - base) // WEALTH_STEP
+
+        untouched_index, _, untouched_values = _group_states([dist[column] for column in untouched])
+        group_index, num_groups, (group_class, group_untouched, group_source) = _group_states([
+            class_index, untouched_index, source_index
+        ])
+
+        class_cycle_pulls = np.zeros(int(group_class.max()) + 1, dtype=np.int64)
+        np.maximum.at(class_cycle_pulls, group_class, source_cycle_pulls[group_source])
+
+        # Order the groups by class, untouched columns and lowest wealth level. Groups that only differ in their pity
+        # source end up next to each other and have their hits added up within the block, the rest of a block has
+        # similar wealth ranges
+        group_lo = np.full(num_groups, levels.max())
+        group_hi = np.zeros(num_groups, dtype=np.int64)
+        np.minimum.at(group_lo, group_index, levels)
+        np.maximum.at(group_hi, group_index, levels)
+
+        group_order = np.lexsort((group_lo, group_untouched, group_class))
+        group_rank = np.empty(num_groups, dtype=np.int64)
+        group_rank[group_order] = np.arange(num_groups)
+
+        row_order = np.argsort(group_rank[group_index], kind="stable")
+        row_starts = np.concatenate([[0], np.cumsum(np.bincount(group_index, minlength=num_groups)[group_order])])
+
+        ordered_class = group_class[group_order].tolist()
+        ordered_lo = group_lo[group_order].tolist()
+        ordered_hi = group_hi[group_order].tolist()
+        parts = []
+        block_start = 0
+
+        while block_start < num_groups:
+            class_id = ordered_class[block_start]
+            cycle_pulls = int(class_cycle_pulls[class_id])
+
+            due = transitions["due"][class_id, :cycle_pulls]
+            level_changes = transitions["level_changes"][class_id, :cycle_pulls]
+            hit_classes = transitions["hit_classes"][class_id, :cycle_pulls]
+            delayed_classes = transitions["delayed_classes"][class_id, :cycle_pulls]
+
+            out_classes = np.unique(np.concatenate([hit_classes, delayed_classes[due]]))
+            hit_out = np.searchsorted(out_classes, hit_classes).tolist()
+            delayed_out = np.searchsorted(out_classes, delayed_classes).tolist()
+
+            lowest_change = int(level_changes.min()) - refund_levels
+            spread = int(level_changes.max()) - lowest_change
+
+            # Grow the block while its dense rows stay within budget
+            block_end, lo, hi = block_start + 1, ordered_lo[block_start], ordered_hi[block_start]
+
+            while block_end < num_groups and ordered_class[block_end] == class_id:
+                new_lo, new_hi = min(lo, ordered_lo[block_end]), max(hi, ordered_hi[block_end])
+                block_entries = (block_end + 1 - block_start) * out_classes.size * (new_hi - new_lo + 1 + spread)
+
+                if block_entries > HIT_BLOCK_ENTRIES:
+                    break
+
+                block_end, lo, hi = block_end + 1, new_lo, new_hi
+
+            groups = group_order[block_start:block_end]
+            rows = row_order[row_starts[block_start]:row_starts[block_end]]
+            width = hi - lo + 1
+
+            wealth_rows = np.bincount((group_rank[group_index[rows]] - block_start) * width + levels[rows] - lo,
+                                      weights=dist["prob"][rows], minlength=groups.size * width)
+            wealth_rows = wealth_rows.reshape(groups.size, width)
+
+            block_before_hard = before_hard[group_source[groups], :cycle_pulls]
+            block_on_hard = on_hard[group_source[groups], :cycle_pulls]
+            hits = np.zeros((groups.size, out_classes.size, width + spread))
+
+            for pull, shift in enumerate((level_changes - lowest_change).tolist()):
+                chances = block_before_hard[:, pull]
+
+                if not due[pull]:
+                    chances = chances + block_on_hard[:, pull]
+
+                if chances.any():
+                    hits[:, hit_out[pull], shift:shift + width] += wealth_rows * chances[:, None]
+
+                if due[pull] and block_on_hard[:, pull].any():
+                    delayed_shift = shift - refund_levels
+                    hits[:, delayed_out[pull], delayed_shift:delayed_shift + width] += (wealth_rows
+                                                                                        * block_on_hard[:, pull, None])
+
+            # Drop the pulls a state could not pay for. They are the ones leaving less than nothing, or less than the
+            # refund in class 0, which only pulls that came with a 4-star lead to
+            wealth_floor = np.where(out_classes == 0, CONIGEM_JEWEL_VALUE, 0)
+            first_levels = -((base - wealth_floor) // WEALTH_STEP) - lo - lowest_change
+
+            for out, first_level in enumerate(first_levels.tolist()):
+                hits[:, out, :max(first_level, 0)] = 0.0
+
+            block_untouched = group_untouched[groups]
+            firsts = np.flatnonzero(np.diff(block_untouched, prepend=-1))
+
+            if firsts.size < groups.size:
+                hits = np.add.reduceat(hits, firsts, axis=0)
+
+            entries = np.flatnonzero(hits)
+            block_row, out, level = np.unravel_index(entries, hits.shape)
+            parts.append({
+                "prob": hits.ravel()[entries],
+                "untouched": block_untouched[firsts][block_row],
+                "class": out_classes[out],
+                "level": level + lo + lowest_change
+            })
+
+            block_start = block_end
+
+        hit = self._merge(self._concat(parts))
+        untouched_index = hit.pop("untouched")
+
+        for column, values in zip(untouched, untouched_values):
+            hit[column] = values[untouched_index]
+
+        hit["wealth"] = base + WEALTH_STEP * hit.pop("level")
+
+        return hit
+
+
+    @staticmethod
+    def _fold_currency(dist, currency, jewel_cost):
+        dist["wealth"] = dist["wealth"] + jewel_cost * dist[currency]
+        dist[currency] = np.zeros(dist["prob"].size, dtype=np.int64)
+
+
+    @staticmethod
+    def _forget(dist, columns):
+        for column in columns:
+            dist[column] = np.zeros(dist["prob"].size, dtype=np.int64)
+
+
+    @staticmethod
+    def _select(dist, mask):
+        return {column: values[mask] for column, values in dist.items()}
+
+
+    @staticmethod
+    def _concat(dists):
+        return {column: np.concatenate([dist[column] for dist in dists]) for column in dists[0]}
+
+
+    @staticmethod
+    def _merge(dist):
+        """
+        Merge identical states by adding up their probabilities and drop impossible ones.
+        """
+        possible = dist["prob"] > 0.0
+        columns = [column for column in dist if column != "prob"]
+
+        if not columns or not possible.any():
+            return {column: values[possible] for column, values in dist.items()}
+
+        values = [dist[column][possible] for column in columns]
+        inverse, num_states, unique_values = _group_states(values)
+
+        if num_states > MAX_STATES:
+            raise PlanTooLargeError("Plan is too large for the exact solver")
+
+        merged = {"prob": np.bincount(inverse, weights=dist["prob"][possible], minlength=num_states)}
+
+        for column, column_values in zip(columns, unique_values):
+            merged[column] = column_values
+
+        return merged
+
+
+    @staticmethod
+    def _add_failure(aggregate, key, dist, failed, obtained_column=None, needed=None):
+        obtained_histogram = None
+
+        if obtained_column is not None:
+            obtained_histogram = np.bincount(dist[obtained_column][failed], weights=dist["prob"][failed],
+                                             minlength=needed + 1).tolist()
+
+        aggregate.add_failures(key, float(dist["prob"][failed].sum()), needed, obtained_histogram)
+
+
+
+def _group_states(values):
+    """
+    Group identical states.
+
+    Columns are packed into a single integer key, which is far cheaper to sort than rows of a 2D array. Keys that fit
+    a table no more than GROUP_TABLE_FACTOR times the number of states are grouped by counting instead of sorting.
+    Columns whose plain ranges are too wide for that are divided by the step their values move in first, wealth for
+    one only takes multiples of WEALTH_STEP. Falls back to row-wise grouping if the packed key could overflow.
+
+    :param values: List of equally long integer column arrays
+
+    Returns:
+        Tuple of (inverse indices, number of unique states, list of unique column arrays)
+    """
+    minimums = [column.min() for column in values]
+    steps = [1] * len(values)
+    spans = [int(column.max()) - int(minimum) + 1 for column, minimum in zip(values, minimums)]
+
+    if math.prod(spans) > GROUP_TABLE_FACTOR * values[0].size:
+        steps = [max(int(np.gcd.reduce(column - minimum)), 1) for column, minimum in zip(values, minimums)]
+        spans = [(span - 1) // step + 1 for span, step in zip(spans, steps)]
+
+    num_keys = math.prod(spans)
+
+    if num_keys >= 2 ** 62:
+        unique_keys, inverse = np.unique(np.stack(values, axis=1), axis=0, return_inverse=True)
+
+        return inverse.ravel(), unique_keys.shape[0], [unique_keys[:, i] for i in range(len(values))]
+
+    keys = np.zeros(values[0].size, dtype=np.int64)
+
+    for column, minimum, step, span in zip(values, minimums, steps, spans):
+        keys = keys * span + (column - minimum) // step
+
+    if num_keys <= GROUP_TABLE_FACTOR * keys.size:
+        present = np.bincount(keys, minlength=num_keys) > 0
+        unique_keys = np.flatnonzero(present)
+        inverse = (np.cumsum(present) - 1)[keys]
+    else:
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+
+    unique_values = []
+
+    for minimum, step, span in zip(reversed(minimums), reversed(steps), reversed(spans)):
+        unique_keys, column = np.divmod(unique_keys, span)
+        unique_values.append(column * step + minimum)
+
+    return inverse, unique_values[0].size, unique_values[::-1]
+
+
+def _cycle_tables(rate, pity_cap):
+    """
+    Tables of a pity cycle by the pity it starts from, built from pulls_to_hit_cdf.
+
+    :param rate: Luck adjusted featured rate
+    :param pity_cap: Hard pity of the banner
+
+    Returns:
+        Tuple of the chances to hit on pull k + 1 before hard pity and on the hard pity pull, and the chance to get
+        through k pulls without a hit, each with a row per starting pity and a column per k
+    """
+    hit_before_hard = np.zeros((pity_cap, pity_cap))
+    hit_on_hard = np.zeros((pity_cap, pity_cap))
+    survival = np.zeros((pity_cap, pity_cap + 1))
+
+    for start_pity in range(pity_cap):
+        cdf = pulls_to_hit_cdf(rate, pity_cap, start_pity)
+        pmf = np.diff(cdf, prepend=0.0)
+
+        hit_before_hard[start_pity, :cdf.size - 1] = pmf[:-1]
+        hit_on_hard[start_pity, cdf.size - 1] = pmf[-1]
+        survival[start_pity, 0] = 1.0
+        survival[start_pity, 1:cdf.size + 1] = 1.0 - cdf
+
+    return hit_before_hard, hit_on_hard, survival
@@ -0,0 +1,84 @@
+# Banner boundaries checkpointed per chunk, the ones before the last banners of the plan. Every checkpoint holds
+# roughly 45 bytes per run and is pickled back from the workers, so checkpointing every banner would cost tens of
+# megabytes per forecast
+MAX_CHECKPOINT_BANNERS = 2
+
+
+class ForecastCheckpoints:
+    """
+    Checkpoints of the last batched forecast before each of its last MAX_CHECKPOINT_BANNERS banners.
+
+    A following forecast with the same settings resumes every chunk from the latest checkpoint its plan still
+    shares with the previous one, so editing one of the last banners or appending a banner only costs the banners
+    from the edit on. Only the latest forecast is kept.
+    """
+
+    def __init__(self):
+        self.settings_key = None
+        self.plan = ()
+        self.seed = None
+
+        # Chunk index -> list of BatchCheckpoint in banner order
+        self.chunks = {}
+
+
+    def prepare(self, simulator, settings_key):
+        """
+        Match a simulator with a compiled plan against the stored forecast.
+
+        Without a fixed seed the simulator adopts the stored seed, so its chunks line up with the stored ones.
+
+        :param simulator: Simulator about to run its forecast
+        :param settings_key: Hash of every input besides the plan the chunks depend on
+
+        Returns:
+            Number of leading banners of the plan whose checkpoints can be resumed
+        """
+        if settings_key != self.settings_key:
+            return 0
+
+        if not simulator.fixed_seed:
+            simulator.seed = self.seed
+
+        shared_banners = 0
+
+        for previous, current in zip(self.plan, simulator.plan):
+            if previous != current:
+                break
+
+            shared_banners += 1
+
+        return shared_banners
+
+
+    def resume_point(self, chunk_index, shared_banners):
+        """
+        Returns:
+            Latest BatchCheckpoint of the chunk within the shared banners, None if the chunk has to start from scratch
+        """
+        resume = None
+
+        for checkpoint in self.chunks.get(chunk_index, []):
+            if checkpoint.banners_done <= shared_banners:
+                resume = checkpoint
+
+        return resume
+
+
+    @staticmethod
+    def first_checkpoint(plan):
+        """
+        Returns:
+            Number of banners done at the first boundary of the plan that is checkpointed
+        """
+        return max(len(plan) - MAX_CHECKPOINT_BANNERS, 1)
+
+
+    def replace(self, settings_key, plan, seed, chunks):
+        """
+        Store the checkpoints of a finished forecast in place of the previous ones.
+        """
+        self.settings_key = settings_key
+        self.plan = tuple(plan)
+        self.seed = seed
+        self.chunks = chunks
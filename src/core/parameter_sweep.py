@@ -0,0 +1,173 @@
+import copy
+import itertools
+import numpy as np
+from src.core.budget_solver import required_jewels_in_worker
+from src.core.confidence_interval import wilson_interval
+from src.core.simulator import run_chunk_in_worker, solve_exact_in_worker
+from src.core.worker_pool import get_worker_pool
+from src.model.enum.engine_type import EngineType
+from src.model.simulation_aggregate import SimulationAggregate
+
+# Sweepable Simulator arguments and the UserAccount attribute each of them sets
+ACCOUNT_PARAMETERS = {
+    "current_jewels": "current_jewels",
+    "plat_tickets": "owned_plat_tickets",
+    "plat_coins": "owned_plat_coins",
+    "starting_pity_character": "current_character_pity",
+    "starting_pity_weapon": "current_weapon_pity",
+    "bp_days_left": "bp_days_left",
+    "sub_days_left": "sub_days_left"
+}
+
+# Parameters that change the income schedule, every distinct combination needs its own compiled plan
+INCOME_PARAMETERS = ("bp_days_left", "sub_days_left")
+
+
+def run_sweep(simulator, grid, max_runs=None):
+    """
+    Forecast the success rate for every combination of the grid's input values.
+
+    Every grid point reuses the simulator's seed and every run draws from its own random stream, so run i sees the
+    same random numbers at every point and differences between points come from the inputs alone. Plans are
+    compiled once per distinct income setting and the chunks of all grid points are dispatched to the worker pool
+    in a single batch.
+
+    With the batch engine a current_jewels axis costs a single forecast per combination of the other parameters.
+    Every run is simulated once with an unlimited budget while recording the starting jewels it needed, see
+    BatchEngine.required_jewels, and succeeds at every jewel amount covering them. Points answered this way report
+    the success figures only, without failure breakdown, spend and leftover.
+
+    :param simulator: Simulator configured with the inputs that are not swept
+    :param grid: Dictionary of Simulator argument names (keys of ACCOUNT_PARAMETERS) to the values to sweep
+    :param max_runs: Runs per grid point, defaults to NUM_SIMULATIONS
+
+    Returns:
+        Dictionary with the swept parameters, their values, the success_rate surface (one array axis per parameter),
+        the seed and the results dictionary of every grid point in row-major order
+    """
+    unknown = [name for name in grid if name not in ACCOUNT_PARAMETERS]
+
+    if unknown:
+        raise ValueError(f"Cannot sweep {', '.join(unknown)}")
+
+    parameters = list(grid.keys())
+    values = [list(grid[name]) for name in parameters]
+    point_simulators = _build_point_simulators(simulator, parameters, values)
+
+    worker_pool = get_worker_pool()
+
+    if simulator.engine_type == EngineType.EXACT:
+        results = worker_pool.run_tasks(solve_exact_in_worker,
+                                        [(point_simulator,) for point_simulator in point_simulators])
+    elif simulator.engine_type == EngineType.BATCH and "current_jewels" in grid:
+        results = _sweep_jewels_by_budget(simulator, parameters, values, max_runs)
+    else:
+        chunks = simulator.plan_chunks(max_runs)
+        tasks = [
+            (point_simulator, chunk_runs, chunk_seed)
+            for point_simulator in point_simulators
+            for chunk_runs, chunk_seed in chunks
+        ]
+        partial_aggregates = worker_pool.run_tasks(run_chunk_in_worker, tasks)
+
+        results = []
+
+        for start in range(0, len(partial_aggregates), len(chunks)):
+            aggregate = SimulationAggregate()
+
+            for partial_aggregate in partial_aggregates[start:start + len(chunks)]:
+                aggregate.merge(partial_aggregate)
+
+            point_results = aggregate.to_results()
+            point_results["seed"] = simulator.seed
+            results.append(point_results)
+
+    success_rate = np.array([point_results["success_rate"] for point_results in results], dtype=float)
+
+    return {
+        "parameters": parameters,
+        "values": values,
+        "success_rate": success_rate.reshape([len(parameter_values) for parameter_values in values]),
+        "seed": simulator.seed,
+        "results": results
+    }
+
+
+def _sweep_jewels_by_budget(simulator, parameters, values, max_runs):
+    """
+    Answer every point of a grid with a current_jewels axis from one unlimited budget forecast per combination
+    of the other parameters.
+
+    Returns:
+        List of the results dictionary of every grid point in row-major order
+    """
+    jewel_axis = parameters.index("current_jewels")
+    other_parameters = parameters[:jewel_axis] + parameters[jewel_axis + 1:]
+    other_values = values[:jewel_axis] + values[jewel_axis + 1:]
+
+    # Skip the jewel axis here, the budget forecast does not depend on the starting jewels
+    group_simulators = _build_point_simulators(simulator, other_parameters, other_values)
+
+    chunks = simulator.plan_chunks(max_runs)
+    tasks = [
+        (group_simulator, chunk_runs, chunk_seed)
+        for group_simulator in group_simulators
+        for chunk_runs, chunk_seed in chunks
+    ]
+    chunk_required = get_worker_pool().run_tasks(required_jewels_in_worker, tasks)
+
+    required = [
+        np.concatenate(chunk_required[start:start + len(chunks)])
+        for start in range(0, len(chunk_required), len(chunks))
+    ]
+    group_shape = [len(parameter_values) for parameter_values in other_values]
+
+    results = []
+
+    for point in itertools.product(*[range(len(parameter_values)) for parameter_values in values]):
+        group = int(np.ravel_multi_index(point[:jewel_axis] + point[jewel_axis + 1:], group_shape)) if group_shape else 0
+        results.append(_budget_point_results(required[group], int(values[jewel_axis][point[jewel_axis]]),
+                                             simulator.seed))
+
+    return results
+
+
+def _budget_point_results(required, jewels, seed):
+    """
+    Results dictionary of a grid point from the starting jewels every run needed.
+    """
+    successful_runs = int(np.count_nonzero(required <= jewels))
+    lower, upper = wilson_interval(successful_runs, required.size)
+
+    return {
+        "success_rate": successful_runs / required.size * 100,
+        "confidence_interval": (lower * 100, upper * 100),
+        "successful_runs": successful_runs,
+        "total_runs": int(required.size),
+        "seed": seed
+    }
+
+
+def _build_point_simulators(simulator, parameters, values):
+    """
+    Copy the simulator once per grid point with that point's account inputs and compiled plan.
+    """
+    plans = {}
+    point_simulators = []
+
+    for point in itertools.product(*values):
+        point_simulator = copy.copy(simulator)
+        point_simulator.account = simulator.account.clone()
+
+        for name, value in zip(parameters, point):
+            setattr(point_simulator.account, ACCOUNT_PARAMETERS[name], int(value))
+
+        income_key = tuple(getattr(point_simulator.account, name) for name in INCOME_PARAMETERS)
+
+        if income_key not in plans:
+            plans[income_key] = point_simulator.compile_plan()
+
+        point_simulator.plan = plans[income_key]
+        point_simulators.append(point_simulator)
+
+    return point_simulators
@@ -0,0 +1,130 @@
+import copy
+import numpy as np
+from src.core.confidence_interval import paired_difference_interval
+from src.core.simulator import solve_exact_in_worker
+from src.core.worker_pool import get_worker_pool
+from src.model.enum.engine_type import EngineType
+from src.model.simulation_aggregate import SimulationAggregate
+
+
+def compare_plans(simulators, max_runs=None, baseline=0):
+    """
+    Forecast several plan variants on common random numbers and compare them run by run.
+
+    Every variant reuses the seed and chunks of the first simulator, and every run draws from its own stream, so the
+    k-th random number of run i is the same in every variant. Differences between variants then mostly come from
+    the plans themselves, and the paired difference of two variants has a much narrower confidence interval than
+    two independent forecasts would give.
+
+    :param simulators: Simulators of the variants, all using the same engine and simulation type
+    :param max_runs: Runs per variant, defaults to NUM_SIMULATIONS
+    :param baseline: Index of the variant every other variant is compared against
+
+    Returns:
+        Dictionary with the seed, the success_rate of every variant, their ranking (variant indices from most to
+        least likely to succeed), the baseline index, the differences to the baseline (one dictionary per variant
+        with the difference and confidence_interval in percentage points) and the results dictionary of every variant
+    """
+    if len({simulator.engine_type for simulator in simulators}) > 1:
+        raise ValueError("All plan variants must use the same engine")
+
+    # Worst luck forecasts a single run, the other variants would be compared on that one run too
+    if len({simulator.simulation_type for simulator in simulators}) > 1:
+        raise ValueError("All plan variants must use the same simulation type")
+
+    variants = _build_variant_simulators(simulators)
+    worker_pool = get_worker_pool()
+
+    if variants[0].engine_type == EngineType.EXACT:
+        results = worker_pool.run_tasks(solve_exact_in_worker, [(variant,) for variant in variants])
+        discordant = None
+    else:
+        chunks = variants[0].plan_chunks(max_runs)
+        chunk_outputs = worker_pool.run_tasks(_run_variants_in_worker,
+                                              [(variants, chunk_runs, chunk_seed) for chunk_runs, chunk_seed in chunks])
+
+        aggregates = [SimulationAggregate() for _ in variants]
+        discordant = np.zeros((len(variants), len(variants)), dtype=np.int64)
+
+        for partial_aggregates, partial_discordant in chunk_outputs:
+            for aggregate, partial_aggregate in zip(aggregates, partial_aggregates):
+                aggregate.merge(partial_aggregate)
+
+            discordant += partial_discordant
+
+        results = []
+
+        for aggregate in aggregates:
+            variant_results = aggregate.to_results()
+            variant_results["seed"] = variants[0].seed
+            results.append(variant_results)
+
+    success_rate = np.array([variant_results["success_rate"] for variant_results in results], dtype=float)
+
+    return {
+        "seed": variants[0].seed,
+        "success_rate": success_rate,
+        "ranking": [int(index) for index in np.argsort(-success_rate, kind="stable")],
+        "baseline": baseline,
+        "differences": [
+            _difference(results, discordant, baseline, variant) for variant in range(len(variants))
+        ],
+        "results": results
+    }
+
+
+def _build_variant_simulators(simulators):
+    """
+    Copy the simulators with the first one's seed and their own compiled plans.
+    """
+    variants = []
+
+    for simulator in simulators:
+        variant = copy.copy(simulator)
+        variant.seed = simulators[0].seed
+        variant.plan = variant.compile_plan()
+        variants.append(variant)
+
+    return variants
+
+
+def _difference(results, discordant, baseline, variant):
+    """
+    Success rate of a variant minus the baseline's, with the paired confidence interval in percentage points.
+    """
+    difference = float(results[variant]["success_rate"] - results[baseline]["success_rate"])
+
+    if discordant is None:
+        # Exact solutions carry no sampling noise. Variants too large for the exact engine were sampled on their own,
+        # the ends of both intervals bound the difference then
+        variant_lower, variant_upper = results[variant]["confidence_interval"]
+        baseline_lower, baseline_upper = results[baseline]["confidence_interval"]
+
+        return {
+            "difference": difference,
+            "confidence_interval": (float(variant_lower - baseline_upper), float(variant_upper - baseline_lower))
+        }
+
+    lower, upper = paired_difference_interval(
+        int(discordant[variant, baseline]),
+        int(discordant[baseline, variant]),
+        results[baseline]["total_runs"]
+    )
+
+    return {"difference": difference, "confidence_interval": (lower * 100, upper * 100)}
+
+
+def _run_variants_in_worker(variants, num_runs, seed):
+    """
+    Run the same chunk for every variant.
+
+    Returns:
+        Tuple of the SimulationAggregate of every variant and the matrix whose entry (i, j) counts the runs where
+        variant i succeeded and variant j did not
+    """
+    succeeded = np.zeros((len(variants), num_runs), dtype=bool)
+    aggregates = [variant.run_chunk(num_runs, seed, succeeded[index]) for index, variant in enumerate(variants)]
+
+    discordant = np.count_nonzero(succeeded[:, np.newaxis, :] & ~succeeded[np.newaxis, :, :], axis=2)
+
+    return aggregates, discordant
@@ -0,0 +1,103 @@
+import time
+from contextlib import contextmanager, nullcontext
+
+
+class Profile:
+    """
+    Wall and CPU time per phase plus event counters of a forecast.
+
+    Workers fill a profile per chunk and the parent merges them, like SimulationAggregate. Phases are only timed at
+    chunk or banner granularity, never per pull.
+    """
+
+    def __init__(self):
+        # name -> [wall_seconds, cpu_seconds, calls]
+        self.phases = {}
+
+        # name -> count, e.g. pulls or rng_draws
+        self.counters = {}
+
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Time the enclosed block as one call of the named phase.
+        """
+        wall = time.perf_counter()
+        cpu = time.process_time()
+
+        try:
+            yield
+        finally:
+            self.add_phase(name, time.perf_counter() - wall, time.process_time() - cpu)
+
+
+    def add_phase(self, name, wall, cpu, calls=1):
+        totals = self.phases.setdefault(name, [0.0, 0.0, 0])
+        totals[0] += wall
+        totals[1] += cpu
+        totals[2] += calls
+
+
+    def count(self, name, amount):
+        self.counters[name] = self.counters.get(name, 0) + int(amount)
+
+
+    def wall(self, name):
+        """
+        Returns:
+            Total wall seconds of the named phase, 0 if it never ran
+        """
+        return self.phases.get(name, [0.0])[0]
+
+
+    def merge(self, other):
+        """
+        Merges another profile into this one.
+
+        Returns:
+            This profile
+        """
+        for name, (wall, cpu, calls) in other.phases.items():
+            self.add_phase(name, wall, cpu, calls)
+
+        for name, amount in other.counters.items():
+            self.count(name, amount)
+
+        return self
+
+
+    def to_results(self):
+        """
+        Build the JSON serializable profile dictionary.
+
+        Returns:
+            Dictionary with phases (name -> wall_seconds, cpu_seconds, calls) and counters
+        """
+        return {
+            "phases": {
+                name: {"wall_seconds": wall, "cpu_seconds": cpu, "calls": calls}
+                for name, (wall, cpu, calls) in self.phases.items()
+            },
+            "counters": dict(self.counters)
+        }
+
+
+class NullProfile:
+    """
+    Stand-in used when profiling is off, every method does nothing.
+    """
+
+    def phase(self, name):
+        return nullcontext()
+
+
+    def add_phase(self, name, wall, cpu, calls=1):
+        pass
+
+
+    def count(self, name, amount):
+        pass
+
+
+NULL_PROFILE = NullProfile()
@@ -0,0 +1,50 @@
+from bisect import bisect_right
+from functools import lru_cache
+import numpy as np
+
+
+@lru_cache(maxsize=None)
+def pulls_to_hit_cdf(rate, pity_cap, start_pity):
+    """
+    Cumulative distribution of the number of pulls until the next 5-star hit.
+
+    Entry k - 1 holds the probability of hitting within k pulls. The last entry is the pull reaching hard pity
+    and is always 1. Tables are built once per process and shared by every run.
+
+    :param rate: Luck adjusted featured rate
+    :param pity_cap: Hard pity of the banner
+    :param start_pity: Pity before the first pull
+
+    Returns:
+        Read-only numpy array of cumulative probabilities
+    """
+    max_pulls = max(pity_cap - start_pity, 1)
+
+    cdf = 1.0 - (1.0 - rate) ** np.arange(1, max_pulls + 1)
+    cdf[-1] = 1.0
+    cdf.setflags(write=False)
+
+    return cdf
+
+
+@lru_cache(maxsize=None)
+def pulls_to_hit_table(rate, pity_cap, start_pity):
+    """
+    pulls_to_hit_cdf as a tuple of Python floats, bisecting it is much faster than a numpy search for a single draw.
+    """
+    return tuple(pulls_to_hit_cdf(rate, pity_cap, start_pity).tolist())
+
+
+def draw_pulls_to_hit(uniform, rate, pity_cap, start_pity):
+    """
+    Draw the number of pulls until the next 5-star hit with a single inverse CDF lookup.
+
+    :param uniform: Uniform random number in [0, 1)
+    :param rate: Luck adjusted featured rate
+    :param pity_cap: Hard pity of the banner
+    :param start_pity: Pity before the first pull
+
+    Returns:
+        Number of pulls, the last of them being the hit
+    """
+    return bisect_right(pulls_to_hit_table(rate, pity_cap, start_pity), uniform) + 1
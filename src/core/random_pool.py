@@ -1,30 +1,156 @@
 import numpy as np
 
+# Every run of a chunk draws from its own counter-based stream: draw k of run i is SplitMix64 output k of a key
+# derived from the chunk seed and i. A run's numbers therefore never depend on how many numbers other runs
+# consumed, so forecasts of plan variants with the same seed see the same numbers run by run.
+
+# SplitMix64 increment and finalizer multipliers
+GOLDEN_GAMMA = np.uint64(0x9E3779B97F4A7C15)
+MIX_MULTIPLIER_1 = np.uint64(0xBF58476D1CE4E5B9)
+MIX_MULTIPLIER_2 = np.uint64(0x94D049BB133111EB)
+
+
+def chunk_key(seed):
+    """
+    Key of a chunk, from which the stream key of each of its runs is derived.
+
+    :param seed: Seed or SeedSequence of the chunk
+    """
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+
+    return seed.generate_state(1, dtype=np.uint64)[0]
+
+
+def run_keys(seed, runs):
+    """
+    Stream keys of the given runs of a chunk.
+
+    :param seed: Seed or SeedSequence of the chunk
+    :param runs: Array of run indices within the chunk
+
+    Returns:
+        uint64 array with the key of every run
+    """
+    return _mix(chunk_key(seed) + (np.asarray(runs, dtype=np.uint64) + np.uint64(1)) * GOLDEN_GAMMA)
+
+
+def stream_uniforms(keys, counters):
+    """
+    Uniform numbers in [0, 1), draw number counters of the streams with the given keys.
+
+    :param keys: uint64 array of stream keys
+    :param counters: uint64 array of draw numbers, broadcast against keys
+    """
+    bits = _mix(keys + (counters + np.uint64(1)) * GOLDEN_GAMMA)
+    bits >>= np.uint64(11)
+
+    return bits * 2.0 ** -53
+
+
+def _mix(values):
+    # Integer arrays wrap around silently, as the 64-bit arithmetic of SplitMix64 requires. Works in place on a
+    # fresh copy, the mixing runs on every draw of the batch engine
+    values = np.array(values, dtype=np.uint64)
+    values ^= values >> np.uint64(30)
+    values *= MIX_MULTIPLIER_1
+    values ^= values >> np.uint64(27)
+    values *= MIX_MULTIPLIER_2
+    values ^= values >> np.uint64(31)
+
+    return values
+
+
 class RandomPool:
-    def __init__(self, buffer_size = 100_000, seed = None):
-        self.rng = np.random.default_rng(seed)
+    """
+    Uniform random numbers of the runs of a chunk, handed out run by run.
+
+    The scalar engines simulate a chunk run by run and take one number per pity cycle and per 50/50. Handing them
+    out from a list of Python floats is several times faster than drawing or indexing numpy scalars one at a time.
+    The keys and the first block of every run are drawn for the whole chunk at once, so starting a run is a list
+    lookup. A run that needs more numbers continues block by block where its previous block ended.
+    """
+
+    def __init__(self, seed=None, num_runs=1, buffer_size=32):
+        """
+        :param seed: Seed or SeedSequence of the chunk
+        :param num_runs: Number of runs in the chunk
+        :param buffer_size: Numbers drawn per block
+        """
+        self.seed = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
         self.buffer_size = buffer_size
-        self.buffer = self.rng.random(buffer_size)
+        self.keys = run_keys(self.seed, np.arange(num_runs))
+        self.first_blocks = stream_uniforms(self.keys[:, np.newaxis], np.arange(buffer_size, dtype=np.uint64)).tolist()
+        self.run = 0
+        self.next_draw = 0
+        self.values = []
         self.index = 0
 
+        # Numbers handed out from blocks that were already replaced
+        self.drawn_before_refill = 0
 
-    def get(self, n = 1):
-        if self.index + n > self.buffer_size:
-            self.buffer = self.rng.random(self.buffer_size)
-            self.index = 0
+        self.select_run(0)
 
-        result = self.buffer[self.index:self.index + n]
-        self.index += n
 
-        return result
+    def select_run(self, run):
+        """
+        Hand out the numbers of the given run of the chunk from now on, starting at its first number.
+        """
+        self.drawn_before_refill += self.index
+        self.run = run
+        self.next_draw = self.buffer_size
+        self.values = self.first_blocks[run]
+        self.index = 0
 
 
     def get_single(self):
-        if self.index >= self.buffer_size:
-            self.buffer = self.rng.random(self.buffer_size)
+        """
+        Hand out the next uniform number in [0, 1) of the selected run as a Python float.
+        """
+        if self.index >= len(self.values):
+            self.drawn_before_refill += self.index
+            counters = np.arange(self.next_draw, self.next_draw + self.buffer_size, dtype=np.uint64)
+            self.values = stream_uniforms(self.keys[self.run], counters).tolist()
+            self.next_draw += self.buffer_size
             self.index = 0
 
-        result = self.buffer[self.index]
+        result = self.values[self.index]
         self.index += 1
 
-        return result
\ No newline at end of file
+        return result
+
+
+    @property
+    def draws(self):
+        """
+        Number of random numbers handed out so far.
+        """
+        return self.drawn_before_refill + self.index
+
+
+class RunStreams:
+    """
+    The streams of every run of a chunk at once, for engines that advance many runs in lockstep.
+    """
+
+    def __init__(self, seed, num_runs):
+        """
+        :param seed: Seed or SeedSequence of the chunk
+        :param num_runs: Number of runs in the chunk
+        """
+        self.keys = run_keys(seed, np.arange(num_runs))
+
+        # Per-run number of draws taken so far, all a checkpoint needs to continue the streams
+        self.counters = np.zeros(num_runs, dtype=np.uint64)
+
+
+    def uniform(self, runs):
+        """
+        Draw the next uniform number in [0, 1) of each of the given runs.
+
+        :param runs: Array of distinct run indices
+        """
+        counters = self.counters[runs]
+        self.counters[runs] = counters + np.uint64(1)
+
+        return stream_uniforms(self.keys[runs], counters)
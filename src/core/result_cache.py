@@ -0,0 +1,144 @@
+import copy
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+def canonical_hash(inputs):
+    """
+    Hash JSON-serializable inputs independently of dictionary order and formatting.
+
+    Returns:
+        Hex digest identifying the inputs
+    """
+    canonical = json.dumps(inputs, sort_keys=True, separators=(",", ":"))
+
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Content-addressed cache of forecast results.
+
+    Recently used results are kept in memory, optionally backed by a directory holding one JSON file per result
+    so they survive restarts. Results are plain data, JSON keeps loading a cache file from running any code.
+    Disk access is best effort, an unreadable or unwritable directory only costs the hit.
+    """
+
+    def __init__(self, max_entries=32, directory=None):
+        """
+        :param max_entries: Number of results kept in memory, least recently used ones are evicted first
+        :param directory: Optional directory of the on-disk tier, created on first write
+        """
+        self.max_entries = max_entries
+        self.directory = directory
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def get(self, key):
+        """
+        Returns:
+            Copy of the cached results of key, None on a miss
+        """
+        with self._lock:
+            results = self._entries.get(key)
+
+            if results is not None:
+                self._entries.move_to_end(key)
+
+        if results is None:
+            results = self._load(key)
+
+            if results is None:
+                return None
+
+            self._remember(key, results)
+
+        return copy.deepcopy(results)
+
+
+    def put(self, key, results):
+        """
+        Cache the results of key in memory and, if configured, on disk.
+        """
+        results = copy.deepcopy(results)
+
+        self._remember(key, results)
+        self._store(key, results)
+
+
+    def clear(self):
+        """
+        Forget every result held in memory, the on-disk tier is kept.
+        """
+        with self._lock:
+            self._entries.clear()
+
+
+    def _remember(self, key, results):
+        with self._lock:
+            self._entries[key] = results
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+
+    def _load(self, key):
+        if self.directory is None:
+            return None
+
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                results = json.load(f)
+
+            # JSON has no tuples, restore the ones callers unpack or use as keys
+            results["confidence_interval"] = tuple(results["confidence_interval"])
+            results["failure_breakdown"] = [
+                (tuple(failure_key), data) for failure_key, data in results["failure_breakdown"]
+            ]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+        return results
+
+
+    def _store(self, key, results):
+        if self.directory is None:
+            return
+
+        path = self._path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(results, f, separators=(",", ":"), default=_to_builtin)
+
+            # Readers never see a partially written file
+            os.replace(temp_path, path)
+        except (OSError, TypeError, ValueError):
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+
+def _to_builtin(value):
+    # Results hold numpy scalars and occasionally arrays next to plain Python values
+    if isinstance(value, np.generic):
+        return value.item()
+
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
@@ -1,41 +1,46 @@
-from multiprocessing import Pool
+import copy
+import pickle
+import time
+import numpy as np
 from src.core.random_pool import RandomPool
+from src.core.worker_pool import get_worker_pool
+from src.core.batch_engine import BatchEngine
+from src.core.exact_engine import ExactEngine, PlanTooLargeError
+from src.core.result_cache import canonical_hash
+from src.core.profiling import Profile, NULL_PROFILE
+from src.core.pull_tables import draw_pulls_to_hit
+from src.core.constants import (
+    PATCH_DURATION_DAYS, MONTHLY_SUB_BONUS, BP_JEWEL_BONUS, BP_PLAT_TICKETS, BP_PLAT_COINS, SMALL_PATCH_JEWELS,
+    BIG_PATCH_JEWELS, CHAR_RATE_TARGETED, CHAR_PITY_TARGETED, CHAR_RATE_CHANCE, CHAR_PITY_CHANCE, WEAPON_RATE,
+    WEAPON_PITY, CHAR_JEWEL_COST, WEAPON_JEWEL_COST, CONIGEM_CONVERSION_RATE, FOUR_STAR_INTERVAL
+)
 from src.model.user_account import UserAccount
+from src.model.pull_target import PullTarget
+from src.model.simulation_aggregate import SimulationAggregate
 from src.model.enum.patch_type import PatchType
 from src.model.enum.banner_type import BannerType
+from src.model.enum.engine_type import EngineType
 from src.model.enum.simulation_type import SimulationType
 
-DEBUG_MODE = False
-NUM_SIMULATIONS = 1 if DEBUG_MODE else 100_000
+NUM_SIMULATIONS = 100_000
 
-PATCH_DURATION_DAYS = 14
+# Part of every result cache key, bump whenever a change alters the results produced for the same inputs
+ENGINE_VERSION = 3
 
-# Income Constants
-MONTHLY_SUB_BONUS = 300
-BP_JEWEL_BONUS = 650
-BP_PLAT_TICKETS = 3
-BP_PLAT_COINS = 7
-
-SMALL_PATCH_JEWELS = 6000
-BIG_PATCH_JEWELS = 10000
-
-# Gacha Constants
-CHAR_RATE_TARGETED = 0.004
-CHAR_PITY_TARGETED = 110
-
-CHAR_RATE_CHANCE = 0.008
-CHAR_PITY_CHANCE = 80
-
-WEAPON_RATE = 0.008
-WEAPON_PITY = 70
-
-CHAR_JEWEL_COST = 150
-WEAPON_JEWEL_COST = 100
+# Runs are always split into chunks of a fixed size, each drawing from its own child seed,
+# so a given seed produces identical results regardless of the number of worker processes
+RUNS_PER_CHUNK = {
+    EngineType.SCALAR: 5_000,
+    EngineType.BATCH: 25_000
+}
 
 
 class Simulator:
     """
     Runs forecast simulations across potentially multiple patches based on user input.
+
+    Besides run_simulations, compile_plan, plan_chunks, run_chunk and solve_exact are the building blocks of
+    forecasts spread over several simulators, such as parameter sweeps, plan comparisons and the budget solver.
     """
 
     def __init__(
@@ -51,7 +56,9 @@ class Simulator:
             bp_days_left,
             buy_monthly_sub,
             sub_days_left,
-            selected_banners
+            selected_banners,
+            engine_type=EngineType.BATCH,
+            seed=None
     ):
         """
         Initialize simulator with player resources and settings.
@@ -66,8 +73,17 @@ class Simulator:
         :param buy_monthly_sub: Boolean representation of whether the player purchases monthly subscriptions
         :param sub_days_left: Days left on the currently running Subscription
         :param selected_banners: Dictionary of patch versions and their configs
+        :param engine_type: EngineType enum for picking between the scalar reference engine, the vectorized batch engine
+                            and the exact Markov chain solver
+        :param seed: Master seed of the simulation, a random one is picked and reported in the results if None
         """
-        self.random_pool = RandomPool()
+        self.seed = np.random.SeedSequence(seed).entropy
+
+        # Results of a random seed are interchangeable with those of any other random seed when caching
+        self.fixed_seed = seed is not None
+
+        # Random numbers of the scalar chunk being simulated, every chunk creates its own
+        self.random_pool = None
 
         self.simulation_type = SimulationType(simulation_type)
 
@@ -81,9 +97,19 @@ class Simulator:
                 self.luck_mod = 1.0
 
         self.banner_type = BannerType(banner_type)
+        self.engine_type = EngineType(engine_type)
 
         self.patch_configs = selected_banners
 
+        # Tuple of PullTarget, compiled once per run_simulations call
+        self.plan = None
+
+        # Whether chunks record a Profile, set by run_simulations
+        self.profiling = False
+
+        # Pulls simulated by the scalar engine in the current chunk
+        self.pull_count = 0
+
         self.account = UserAccount(
             current_jewels,
             plat_tickets,
@@ -97,128 +123,582 @@ class Simulator:
         )
 
 
-    def run_simulations(self):
-        num_runs = 1 if self.simulation_type == SimulationType.WORST_LUCK else NUM_SIMULATIONS
+    def __getstate__(self):
+        state = self.__dict__.copy()
+
+        # Every chunk seeds its own RandomPool, a finished chunk's numbers are never shipped
+        state.pop("random_pool", None)
+
+        return state
+
+
+    def run_simulations(self, precision=None, max_runs=None, time_limit=None, progress=None, cancel_token=None,
+                        cache=None, checkpoints=None, profile=False):
+        """
+        Run the forecast.
+
+        With a precision or time limit set, runs are simulated chunk by chunk and the forecast stops as soon as
+        the 95% confidence interval of the success rate is narrow enough or the time is up.
+
+        :param precision: Target half-width of the success rate's confidence interval in percentage points,
+                          None to always simulate max_runs
+        :param max_runs: Maximum number of runs, defaults to NUM_SIMULATIONS
+        :param time_limit: Seconds after which no further chunks are started, None for no limit
+        :param progress: Optional callable receiving a progress dictionary (see _report_progress) every time
+                         a chunk has been merged, called from the thread running the forecast
+        :param cancel_token: Optional CancellationToken, checked before the forecast and between chunks
+        :param cache: Optional ResultCache, a forecast of identical inputs is answered from it without simulating
+        :param checkpoints: Optional ForecastCheckpoints, the batch engine resumes from the banners the plan shares
+                            with the previous forecast and stores its own checkpoints in it
+        :param profile: Whether to time the phases of the forecast and count pulls and random draws,
+                        see _profile_results
+
+        Raises:
+            SimulationCancelled if the token is cancelled before the forecast finishes
+
+        Returns:
+            Results dictionary as built by SimulationAggregate.to_results plus the seed,
+            adaptive forecasts also report the stop_reason and target_precision.
+            The exact engine ignores all parameters, reports probabilities of a single run and sets exact to True,
+            see solve_exact for plans too large for it.
+            Results answered from the cache set cached to True, profiled forecasts add the profile
+        """
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+
+        self.profiling = profile
+        forecast_profile = Profile() if profile else NULL_PROFILE
+        start_time = time.perf_counter()
+
+        with forecast_profile.phase("compile_plan"):
+            self.plan = self.compile_plan()
+
+        if cache is not None:
+            cache_key = self._cache_key(precision, max_runs, time_limit)
+            results = cache.get(cache_key)
+
+            if results is not None:
+                results["cached"] = True
+
+                return results
+
+        if self.engine_type == EngineType.EXACT:
+            with forecast_profile.phase("solve"):
+                results = self.solve_exact()
+        else:
+            results = self._run_monte_carlo(precision, max_runs, time_limit, progress, cancel_token, checkpoints,
+                                            forecast_profile)
+
+        # Sampled fallbacks of the exact engine depend on the seed, which its cache keys leave out
+        if cache is not None and not results.get("exact_fallback"):
+            cache.put(cache_key, results)
+
+        if profile:
+            results["profile"] = self._profile_results(forecast_profile, time.perf_counter() - start_time)
+
+        return results
+
+
+    def _run_monte_carlo(self, precision, max_runs, time_limit, progress, cancel_token, checkpoints, forecast_profile):
+        """
+        Simulate the compiled plan chunk by chunk, see run_simulations.
+        """
+        resumable = checkpoints is not None and self.engine_type == EngineType.BATCH
+
+        if resumable:
+            settings_key = canonical_hash({**self._input_fingerprint(), "max_runs": max_runs})
+            shared_banners = checkpoints.prepare(self, settings_key)
+            chunk_checkpoints = {}
+
+        chunks = self.plan_chunks(max_runs)
+        planned_runs = sum(chunk_runs for chunk_runs, _ in chunks)
+
+        adaptive = precision is not None or time_limit is not None
+        chunks_per_round = get_worker_pool().processes if adaptive else len(chunks)
+
+        if self.profiling:
+            self._profile_dispatch(forecast_profile, len(chunks))
+
+        aggregate = SimulationAggregate()
+        stop_reason = "max_runs"
+        start_time = time.perf_counter()
+        start_cpu = time.process_time()
+
+        for round_start in range(0, len(chunks), chunks_per_round):
+            # Chunks are merged and checked in order, so the stopping point does not depend on the worker count
+            round_indices = range(round_start, min(round_start + chunks_per_round, len(chunks)))
+
+            if resumable:
+                partial_aggregates = self._run_resumable_chunks(chunks, round_indices, checkpoints, shared_banners,
+                                                                chunk_checkpoints, cancel_token)
+            else:
+                partial_aggregates = self._run_chunks([chunks[index] for index in round_indices], cancel_token)
+
+            for partial_aggregate in partial_aggregates:
+                with forecast_profile.phase("merge"):
+                    aggregate.merge(partial_aggregate)
+
+                if progress is not None:
+                    self._report_progress(progress, aggregate, planned_runs, time.perf_counter() - start_time)
+
+                if precision is not None and self._precision_reached(aggregate, precision):
+                    stop_reason = "precision"
+                    break
+
+            if stop_reason == "precision":
+                break
+
+            if time_limit is not None and time.perf_counter() - start_time >= time_limit:
+                stop_reason = "time_limit"
+                break
+
+        if self.profiling:
+            # Time the parent spent blocked on chunks, everything in the loop but merging
+            merge_wall, merge_cpu, _ = forecast_profile.phases.get("merge", (0.0, 0.0, 0))
+            forecast_profile.add_phase("wait", time.perf_counter() - start_time - merge_wall,
+                                       time.process_time() - start_cpu - merge_cpu)
+
+            if aggregate.profile is not None:
+                forecast_profile.merge(aggregate.profile)
+
+        if resumable:
+            checkpoints.replace(settings_key, self.plan, self.seed, chunk_checkpoints)
+
+        results = aggregate.to_results()
+        results["seed"] = self.seed
+
+        if adaptive:
+            results["stop_reason"] = stop_reason
+            results["target_precision"] = precision
+
+        return results
+
+
+    def _input_fingerprint(self):
+        """
+        Every input the results depend on besides the compiled plan and the run parameters.
+
+        Income settings only enter through the compiled plan. Unless a seed was fixed, results of equal inputs
+        are interchangeable samples and the seed is left out.
+        """
+        account = self.account
+
+        return {
+            "engine_version": ENGINE_VERSION,
+            "engine_type": self.engine_type.name,
+            "simulation_type": self.simulation_type.name,
+            "banner_type": self.banner_type.name,
+            "account": [
+                account.current_jewels, account.owned_plat_tickets, account.owned_plat_coins, account.violet_conigems,
+                account.current_character_pity, account.current_weapon_pity,
+                account.char_pulls_since_4star, account.weapon_pulls_since_4star
+            ],
+            "seed": self.seed if self.fixed_seed else None
+        }
+
+
+    def _profile_dispatch(self, forecast_profile, num_chunks):
+        """
+        Time starting the worker pool and serializing the simulator that every chunk task ships.
+        """
+        worker_pool = get_worker_pool()
+        workers = 1 if num_chunks == 1 or worker_pool.processes == 1 else min(worker_pool.processes, num_chunks)
+        forecast_profile.count("workers", workers)
+        forecast_profile.count("chunks", num_chunks)
+
+        if workers == 1:
+            return
+
+        with forecast_profile.phase("pool_startup"):
+            worker_pool.warm_up()
+
+        with forecast_profile.phase("pickle"):
+            task_bytes = len(pickle.dumps(self))
+
+        forecast_profile.count("task_bytes", task_bytes * num_chunks)
+
 
-        if num_runs != 1:
-            with Pool() as pool:
-                results = pool.starmap(self._run,
-                                       [(self.account.clone(),) for _ in range(num_runs)])
+    @staticmethod
+    def _profile_results(forecast_profile, wall_seconds):
+        """
+        Build the profile of a finished forecast.
+
+        Parent phases are compile_plan, solve (exact engine), pool_startup, pickle (serializing the simulator once),
+        wait (blocked on chunks) and merge. Chunk phases, summed over all chunks, are chunk_setup, simulate and
+        aggregate (the batch engine aggregates while simulating).
+
+        Returns:
+            Dictionary of Profile.to_results plus the forecast's wall_seconds, pulls_per_second and
+            worker_utilization, the share of the waiting time the workers spent on chunks. The latter two are None
+            for the exact engine
+        """
+        results = forecast_profile.to_results()
+        counters = results["counters"]
+
+        chunk_wall = sum(forecast_profile.wall(name) for name in ("chunk_setup", "simulate", "aggregate"))
+        wait_wall = forecast_profile.wall("wait")
+        workers = counters.get("workers", 1)
+
+        results["wall_seconds"] = wall_seconds
+        results["pulls_per_second"] = counters["pulls"] / wall_seconds if "pulls" in counters and wall_seconds > 0 else None
+        results["worker_utilization"] = chunk_wall / (wait_wall * workers) if wait_wall > 0 else None
+
+        return results
+
+
+    def _cache_key(self, precision, max_runs, time_limit):
+        """
+        Canonical hash of every input the results of the compiled plan depend on.
+        """
+        inputs = self._input_fingerprint()
+        inputs["plan"] = [list(target) for target in self.plan]
+
+        if self.engine_type == EngineType.EXACT:
+            inputs["seed"] = None
         else:
-            results = [self._run(self.account.clone()) for _ in range(num_runs)]
+            inputs.update(precision=precision, max_runs=max_runs, time_limit=time_limit)
+
+        return canonical_hash(inputs)
+
+
+    @staticmethod
+    def _report_progress(progress, aggregate, planned_runs, elapsed):
+        """
+        Report the runs merged so far and the provisional success rate.
+
+        The eta assumes the remaining runs go at the average speed so far, adaptive forecasts may stop earlier.
+        """
+        completed_runs = aggregate.total_runs
+        remaining_runs = planned_runs - completed_runs
+
+        progress({
+            "completed_runs": completed_runs,
+            "planned_runs": planned_runs,
+            "fraction": completed_runs / planned_runs,
+            "elapsed": elapsed,
+            "eta": elapsed / completed_runs * remaining_runs if completed_runs else None,
+            "success_rate": aggregate.successful_runs / completed_runs * 100 if completed_runs else 0,
+            "confidence_interval": aggregate.confidence_interval()
+        })
+
+
+    def solve_exact(self):
+        """
+        Solve the compiled plan with the exact engine, see compile_plan.
+
+        Plans that need more states than the exact engine keeps (see ExactEngine) are forecast with NUM_SIMULATIONS
+        runs of the batch engine instead, chunked as in plan_chunks and run in-process.
+
+        Returns:
+            Results dictionary with the seed and exact set to True, or set to False and exact_fallback set to True
+            for plans that were sampled instead
+        """
+        try:
+            aggregate = ExactEngine(self).run()
+        except PlanTooLargeError:
+            return self._sample_instead_of_solving()
+
+        results = aggregate.to_results()
+        results["seed"] = self.seed
+        results["exact"] = True
+
+        # No sampling noise, the interval collapses to the success rate itself
+        results["confidence_interval"] = (results["success_rate"], results["success_rate"])
+
+        return results
+
+
+    def _sample_instead_of_solving(self):
+        """
+        Forecast the compiled plan with the batch engine for solve_exact.
+        """
+        sampler = copy.copy(self)
+        sampler.engine_type = EngineType.BATCH
+
+        aggregate = SimulationAggregate()
+
+        for chunk_runs, chunk_seed in sampler.plan_chunks(None):
+            aggregate.merge(sampler.run_chunk(chunk_runs, chunk_seed))
+
+        results = aggregate.to_results()
+        results["seed"] = self.seed
+        results["exact"] = False
+        results["exact_fallback"] = True
+
+        return results
+
+
+    def plan_chunks(self, max_runs):
+        """
+        Split the forecast into chunks, each drawing from its own child seed of the master seed.
+        Simulators sharing the seed get the same chunks, their runs see the same random numbers run by run.
+
+        :param max_runs: Maximum number of runs, None for NUM_SIMULATIONS
+
+        Returns:
+            List of (num_runs, seed) tuples
+        """
+        if self.simulation_type == SimulationType.WORST_LUCK:
+            max_runs = 1
+        elif max_runs is None:
+            max_runs = NUM_SIMULATIONS
+
+        chunk_sizes = _split_runs(max_runs, RUNS_PER_CHUNK[self.engine_type])
+        chunk_seeds = np.random.SeedSequence(self.seed).spawn(len(chunk_sizes))
+
+        return list(zip(chunk_sizes, chunk_seeds))
+
+
+    def _run_chunks(self, chunks, cancel_token=None):
+        """
+        Run chunks in-process or on the worker pool.
+
+        :param chunks: List of (num_runs, seed) tuples
+        :param cancel_token: Optional CancellationToken
+
+        Returns:
+            Iterator over one SimulationAggregate per chunk in the given order, streamed as the chunks finish
+        """
+        # One task per chunk, so the simulator is pickled once per chunk instead of once per run
+        return get_worker_pool().imap_tasks(run_chunk_in_worker,
+                                            [(self, chunk_runs, chunk_seed) for chunk_runs, chunk_seed in chunks],
+                                            cancel_token)
+
+
+    def _run_resumable_chunks(self, chunks, indices, checkpoints, shared_banners, chunk_checkpoints, cancel_token):
+        """
+        Run batched chunks from their last checkpoint the plan still shares, collecting the new checkpoints.
+
+        :param chunks: List of (num_runs, seed) tuples of the whole forecast
+        :param indices: Indices of the chunks to run
+        :param checkpoints: ForecastCheckpoints of the previous forecast
+        :param shared_banners: Number of leading banners shared with the previous forecast
+        :param chunk_checkpoints: Dictionary receiving the checkpoints of every finished chunk by index
+        :param cancel_token: Optional CancellationToken
+
+        Returns:
+            Iterator over one SimulationAggregate per chunk in the given order, streamed as the chunks finish
+        """
+        first_checkpoint = checkpoints.first_checkpoint(self.plan)
+        resume_points = [checkpoints.resume_point(index, shared_banners) for index in indices]
+        tasks = [(self, *chunks[index], resume, first_checkpoint) for index, resume in zip(indices, resume_points)]
+        results = get_worker_pool().imap_tasks(_run_resumable_chunk_in_worker, tasks, cancel_token)
+
+        for index, resume, (aggregate, new_checkpoints) in zip(indices, resume_points, results):
+            reused = [
+                checkpoint for checkpoint in checkpoints.chunks.get(index, [])
+                if resume is not None and first_checkpoint <= checkpoint.banners_done <= resume.banners_done
+            ]
+            chunk_checkpoints[index] = reused + new_checkpoints
+
+            yield aggregate
+
+
+    @staticmethod
+    def _precision_reached(aggregate, precision):
+        lower, upper = aggregate.confidence_interval()
+
+        return (upper - lower) / 2 <= precision
+
+
+    def run_chunk(self, num_runs, seed, succeeded=None):
+        """
+        Run a chunk of simulations of the compiled plan locally and aggregate their outcomes, see compile_plan
+        and plan_chunks.
+
+        :param num_runs: Number of simulation runs in this chunk
+        :param seed: SeedSequence of this chunk's random stream
+        :param succeeded: Optional boolean array of num_runs entries, filled with whether each run succeeded
+
+        Returns:
+            SimulationAggregate of this chunk
+        """
+        profile = Profile() if self.profiling else NULL_PROFILE
+
+        if self.engine_type == EngineType.BATCH:
+            with profile.phase("chunk_setup"):
+                engine = BatchEngine(self, seed)
+
+            with profile.phase("simulate"):
+                aggregate = engine.run(num_runs)
+
+            if succeeded is not None:
+                succeeded[:] = engine.succeeded
+
+            self._attach_profile(profile, aggregate, num_runs, engine.pull_count, engine.rng_draws)
+
+            return aggregate
+
+        with profile.phase("chunk_setup"):
+            self.random_pool = RandomPool(seed, num_runs)
+
+        aggregate = SimulationAggregate()
+        self.pull_count = 0
+
+        # Preallocated once per chunk and summarized into histograms, so memory does not grow with the run count
+        spent = np.zeros((num_runs, len(self.plan), 3), dtype=np.int64)
+        leftover = np.zeros((num_runs, 3), dtype=np.int64)
+
+        with profile.phase("simulate"):
+            for run in range(num_runs):
+                self.random_pool.select_run(run)
+                account = self.account.clone()
+                obtained_chars, obtained_weapons, failures = self._run(account, spent[run])
+                run_succeeded = self._all_succeeded(obtained_chars, obtained_weapons)
+                aggregate.add_run(run_succeeded, failures)
+
+                if succeeded is not None:
+                    succeeded[run] = run_succeeded
+
+                leftover[run] = account.holdings()
+
+        with profile.phase("aggregate"):
+            aggregate.add_spend([target.patch_version for target in self.plan], spent)
+            aggregate.add_leftover(leftover)
+
+        self._attach_profile(profile, aggregate, num_runs, self.pull_count, self.random_pool.draws)
+
+        return aggregate
+
+
+    def _attach_profile(self, profile, aggregate, num_runs, pulls, rng_draws):
+        """
+        Record the chunk's counters and hand its profile to the parent along with the aggregate.
+        """
+        if not self.profiling:
+            return
 
-        return self._calculate_success_rate(results, num_runs)
+        profile.count("runs", num_runs)
+        profile.count("pulls", pulls)
+        profile.count("rng_draws", rng_draws)
+        aggregate.profile = profile
 
 
-    def _run(self, account):
+    def _run_resumable_chunk(self, num_runs, seed, resume, first_checkpoint):
+        """
+        Run a chunk with the batch engine, optionally from a checkpoint, and checkpoint its last banners.
+
+        :param num_runs: Number of simulation runs in this chunk
+        :param seed: SeedSequence of this chunk's random stream
+        :param resume: BatchCheckpoint of this chunk to continue from, None to start from the first banner
+        :param first_checkpoint: Number of banners done from which on the chunk is checkpointed
+
+        Returns:
+            Tuple of the chunk's SimulationAggregate and the list of BatchCheckpoint of the checkpointed banners
+        """
+        profile = Profile() if self.profiling else NULL_PROFILE
+
+        with profile.phase("chunk_setup"):
+            engine = BatchEngine(self, seed)
+
+        checkpoints = []
+
+        with profile.phase("simulate"):
+            aggregate = engine.run(num_runs, resume, checkpoints, first_checkpoint)
+
+        self._attach_profile(profile, aggregate, num_runs, engine.pull_count, engine.rng_draws)
+
+        return aggregate, checkpoints
+
+
+    def _run(self, account, spent=None):
         """
         Main simulation loop.
 
+        :param account: Account of this run, modified in place
+        :param spent: Optional array of shape (pull targets, 3) filled with the jewel wealth, tickets and coins
+                      spent on every banner
+
         Return:
             List of (obtained_chars, obtained_weapons, failure_info)
         """
-
-        if not hasattr(self, "random_pool"):
-            self.random_pool = RandomPool(buffer_size=10_000)
-
-        patch_versions = list(self.patch_configs.keys())
-        num_banners = len(patch_versions)
+        num_banners = len(self.plan)
 
         obtained_chars = [False] * num_banners
         obtained_weapons = [False] * num_banners
         failures = []
 
-        for idx, patch_version in enumerate(patch_versions):
-            banner_config = self.patch_configs[patch_version]
+        for idx, target in enumerate(self.plan):
+            # Close the spend of the previous banner before its successor's income arrives
+            if spent is not None and idx > 0:
+                spent[idx - 1] -= account.holdings()
 
-            # Add income for patch period
-            self._process_patch_income(account, idx, patch_version, patch_versions)
+            # Add income gathered since the previous banner
+            self._process_patch_income(account, target)
 
-            # Attempt character pulls
-            char_success = self._attempt_character_pulls(account, idx, banner_config, obtained_chars)
+            if spent is not None:
+                spent[idx] = account.holdings()
 
-            if banner_config.get("pull_char", False) and not char_success:
-                char_name = banner_config.get("featured_character", "")
+            # Attempt character pulls
+            char_success = self._attempt_character_pulls(account, idx, target, obtained_chars)
 
+            # If base char fails, skip rest
+            if not char_success:
                 failures.append({
-                    "patch": patch_version,
+                    "patch": target.patch_version,
                     "failure_type": "character",
-                    "featured_character": char_name
+                    "featured_character": target.featured_character
                 })
 
-            # If base char fails, skip rest
-            if not char_success:
                 continue
 
-            weapon_success = self._attempt_weapon_pulls(account, idx, banner_config, obtained_weapons)
-
-            if banner_config.get("pull_weapon", False) and not weapon_success:
-                char_name = banner_config.get("featured_character", "")
+            weapon_success = self._attempt_weapon_pulls(account, idx, target, obtained_weapons)
 
+            # If weapon was desired but not pulled, skip duplicates/refinements
+            if target.pull_weapon and not weapon_success:
                 failures.append({
-                    "patch": patch_version,
+                    "patch": target.patch_version,
                     "failure_type": "weapon",
-                    "featured_character": char_name
+                    "featured_character": target.featured_character
                 })
 
-            # If weapon was desired but not pulled, skip duplicates/refinements
-            if not weapon_success and banner_config.get("pull_weapon", False):
                 continue
 
             # Awareness & Refinement pulls
-            awareness = banner_config.get("awareness", 0)
+            awareness = target.awareness
             duplicates_obtained = 0
 
-            for dup_num in range(awareness):
-                if self._pull_character(account):
-                    duplicates_obtained += 1
-
-                    if DEBUG_MODE:
-                        print(f"Got character duplicate {dup_num + 1}/{awareness}!")
-                else:
-                    if DEBUG_MODE:
-                        print(f"Ran out of jewels at duplicate {dup_num + 1}/{awareness}")
+            for _ in range(awareness):
+                if not self._pull_character(account):
                     break
 
-            refinement = banner_config.get("refinement", 0)
-            refinements_obtained = 0
+                duplicates_obtained += 1
 
-            for ref_num in range(refinement):
-                if self._pull_weapon(account):
-                    refinements_obtained += 1
+            refinement = target.refinement
+            refinements_obtained = 0
 
-                    if DEBUG_MODE:
-                        print(f"Got weapon refinement {ref_num + 1}/{refinement}!")
-                else:
-                    if DEBUG_MODE:
-                        print(f"Ran out of jewels at refinement {ref_num + 1}/{refinement}")
+            for _ in range(refinement):
+                if not self._pull_weapon(account):
                     break
 
+                refinements_obtained += 1
+
             # Mark as failed if didn't get all duplicates/refinements
             if duplicates_obtained < awareness:
                 obtained_chars[idx] = False
-                char_name = banner_config.get("featured_character", "")
 
                 failures.append({
-                    "patch": patch_version,
+                    "patch": target.patch_version,
                     "failure_type": "awareness",
-                    "featured_character": char_name,
+                    "featured_character": target.featured_character,
                     "obtained": duplicates_obtained,
                     "needed": awareness
                 })
 
             if weapon_success and refinements_obtained < refinement:
                 obtained_weapons[idx] = False
-                char_name = banner_config.get("featured_character", "")
 
                 failures.append({
-                    "patch": patch_version,
+                    "patch": target.patch_version,
                     "failure_type": "refinement",
-                    "featured_character": char_name,
+                    "featured_character": target.featured_character,
                     "obtained": refinements_obtained,
                     "needed": refinement
                 })
 
+        if spent is not None and num_banners:
+            spent[-1] -= account.holdings()
+
         return obtained_chars, obtained_weapons, failures
 
 
@@ -305,51 +785,41 @@ class Simulator:
             True if character obtained, False otherwise
         """
         if self.banner_type == BannerType.CHANCE: #Chance (50/50) Banner
-            guaranteed_next = False
-
-            while True:
-                while True:
-                    if not account.spend_ticket():
-                        if account.current_jewels < CHAR_JEWEL_COST and account.violet_conigems >= 10:
-                            account.convert_conigems()
-
-                        if not account.spend_jewels(CHAR_JEWEL_COST):
-                            return False
-
-                    account.increment_character_pity()
-
-                    if account.char_pulls_since_4star >= 10 and account.current_character_pity < CHAR_PITY_CHANCE:
-                        account.reset_character_4star_counter()
+            rate, pity_cap, fifty_fifty = CHAR_RATE_CHANCE * self.luck_mod, CHAR_PITY_CHANCE, True
+        else:  # Targeted (110 Pity) Banner
+            rate, pity_cap, fifty_fifty = CHAR_RATE_TARGETED * self.luck_mod, CHAR_PITY_TARGETED, False
 
-                    if self.random_pool.get_single() < (CHAR_RATE_CHANCE * self.luck_mod) or account.current_character_pity >= CHAR_PITY_CHANCE:
-                        account.reset_character_pity()
+        guaranteed_next = False
 
-                        if guaranteed_next:
-                            return True
-                        else:
-                            if self.random_pool.get_single() >= (0.5 * self.luck_mod):
-                                guaranteed_next = True
-                                break
-                            else:
-                                return True
+        while True:
+            # The pulls until the next 5-star are drawn at once, only paying for them is done pull by pull
+            pulls = draw_pulls_to_hit(self.random_pool.get_single(), rate, pity_cap, account.current_character_pity)
 
-        else:  # Targeted (110 Pity) Banner
-            while True:
+            for pull in range(pulls):
                 if not account.spend_ticket():
-                    if account.current_jewels < CHAR_JEWEL_COST and account.violet_conigems >= 10:
+                    if account.current_jewels < CHAR_JEWEL_COST and account.violet_conigems >= CONIGEM_CONVERSION_RATE:
                         account.convert_conigems()
 
                     if not account.spend_jewels(CHAR_JEWEL_COST):
+                        self.pull_count += pull
                         return False
 
                 account.increment_character_pity()
 
-                if account.char_pulls_since_4star >= 10 and account.current_character_pity < CHAR_PITY_TARGETED:
+                if account.char_pulls_since_4star >= FOUR_STAR_INTERVAL and account.current_character_pity < pity_cap:
                     account.reset_character_4star_counter()
 
-                if self.random_pool.get_single() < (CHAR_RATE_TARGETED * self.luck_mod) or account.current_character_pity >= CHAR_PITY_TARGETED:
-                    account.reset_character_pity()
-                    return True
+            self.pull_count += pulls
+            account.reset_character_pity()
+
+            if not fifty_fifty or guaranteed_next:
+                return True
+
+            # 50/50: Return True on win, go into the next pity cycle on loss
+            if self.random_pool.get_single() >= (0.5 * self.luck_mod):
+                guaranteed_next = True
+            else:
+                return True
 
 
     def _pull_weapon(self, account):
@@ -363,217 +833,180 @@ class Simulator:
         Returns:
             True if weapon obtained, False if insufficient resources
         """
-
+        rate = WEAPON_RATE * self.luck_mod
         guaranteed_next = False
 
         while True:
-            while True:
+            pulls = draw_pulls_to_hit(self.random_pool.get_single(), rate, WEAPON_PITY, account.current_weapon_pity)
+
+            for pull in range(pulls):
                 if not account.spend_milicoin():
-                    if account.current_jewels < WEAPON_JEWEL_COST and account.violet_conigems >= 10:
+                    if (account.current_jewels < WEAPON_JEWEL_COST
+                            and account.violet_conigems >= CONIGEM_CONVERSION_RATE):
                         account.convert_conigems()
 
                     if not account.spend_jewels(WEAPON_JEWEL_COST):
+                        self.pull_count += pull
                         return False
 
                 account.increment_weapon_pity()
 
-                if account.weapon_pulls_since_4star >= 10 and account.current_weapon_pity < WEAPON_PITY:
+                if account.weapon_pulls_since_4star >= FOUR_STAR_INTERVAL and account.current_weapon_pity < WEAPON_PITY:
                     account.reset_weapon_4star_counter()
 
-                if self.random_pool.get_single() < (WEAPON_RATE * self.luck_mod) or account.current_weapon_pity >= WEAPON_PITY:
-                    account.reset_weapon_pity()
+            self.pull_count += pulls
+            account.reset_weapon_pity()
 
-                    if guaranteed_next:
-                        return True
+            if guaranteed_next:
+                return True
 
-                    # 50/50: Return True on win, go into the next pity cycle on loss
-                    if self.random_pool.get_single() >= (0.5 * self.luck_mod):
-                        guaranteed_next = True
-                        break
-                    else:
-                        return True
+            # 50/50: Return True on win, go into the next pity cycle on loss
+            if self.random_pool.get_single() >= (0.5 * self.luck_mod):
+                guaranteed_next = True
+            else:
+                return True
 
 
-    def _process_patch_income(self, account, idx, patch_version, patch_versions):
+    def compile_plan(self):
         """
-        Add income for this patch.
+        Compile the selected banners into the banners that are actually pulled on.
 
-        :param account: UserAccount to process resources
-        :param idx: Current patch index
-        :param patch_version: Current patch version string
-        :param patch_versions: List of all patch versions
+        Income does not depend on pull outcomes, so it is computed once per forecast on a template account.
+        Unselected patches only contribute their income, which is carried over to the next pull target,
+        so the per-run loop only scales with the number of selected banners.
+        run_chunk and solve_exact work on the plan attribute, which the caller sets to the compiled plan.
+
+        Returns:
+            Tuple of PullTarget in patch order
         """
-        if idx > 0 and idx < len(patch_versions) - 1:
-            next_patch = patch_versions[idx + 1]
-            self._add_income(account, patch_version, next_patch)
+        account = self.account.clone()
+        patch_versions = list(self.patch_configs.keys())
 
-        if DEBUG_MODE:
-            final_patch = " (Final Patch)" if idx == len(patch_versions) - 1 else ""
-            print(f"\n=== Patch {patch_version}{final_patch} ===")
-            print(f"Available jewels: {account.current_jewels:,}")
-            print(f"Violet conigems: {account.violet_conigems}")
-            print(f"Character pity: {account.current_character_pity}")
-            print(f"Plat tickets: {account.owned_plat_tickets}")
-            print(f"Plat coins: {account.owned_plat_coins}")
+        plan = []
+        jewels_before = account.current_jewels
+        tickets_before = account.owned_plat_tickets
+        coins_before = account.owned_plat_coins
 
+        for idx, patch_version in enumerate(patch_versions):
+            banner_config = self.patch_configs[patch_version]
 
-    def _attempt_character_pulls(self, account, idx, banner_config, obtained_chars):
-        """
-        Attempt to pull all needed characters from this banner.
+            if idx > 0 and idx < len(patch_versions) - 1:
+                next_patch = patch_versions[idx + 1]
+                self._add_income(account, patch_version, next_patch)
 
-        :param: account: UserAccount with which to perform the pulls
-        :param idx: Current banner index
-        :param banner_config: Configuration for this banner
-        :param obtained_chars: List tracking which characters were obtained
+            if not banner_config.get("pull_char", False):
+                continue
 
-        Returns:
-            True if all characters obtained, False otherwise
-        """
-        pull_char = banner_config.get("pull_char", False)
+            plan.append(PullTarget(
+                patch_version,
+                banner_config.get("featured_character", ""),
+                banner_config.get("awareness", 0),
+                banner_config.get("pull_weapon", False),
+                banner_config.get("refinement", 0),
+                account.current_jewels - jewels_before,
+                account.owned_plat_tickets - tickets_before,
+                account.owned_plat_coins - coins_before
+            ))
 
-        if not pull_char:
-            return False
+            jewels_before = account.current_jewels
+            tickets_before = account.owned_plat_tickets
+            coins_before = account.owned_plat_coins
 
-        awareness = banner_config.get("awareness", 0)
-        chars_needed = awareness + 1
-        chars_obtained = 0
+        return tuple(plan)
 
-        jewels_before = account.current_jewels
-        tickets_before = account.owned_plat_tickets
 
-        for char_num in range(chars_needed):
-            char_success = self._pull_character(account)
+    def _process_patch_income(self, account, target):
+        """
+        Add the income gathered since the previous pull target.
 
-            if char_success:
-                chars_obtained += 1
+        :param account: UserAccount to process resources
+        :param target: PullTarget about to be pulled on
+        """
+        account.add_jewels(target.jewels)
+        account.add_tickets(target.tickets)
+        account.add_milicoins(target.coins)
 
-                if DEBUG_MODE:
-                    duplicate_text = f" (duplicate {char_num})" if char_num > 0 else ""
-                    print(f"Got character{duplicate_text}!")
-            else:
-                if DEBUG_MODE:
-                    duplicate_text = f" (duplicate {char_num})" if char_num > 0 else ""
-                    print(f"Ran out of jewels while pulling character{duplicate_text}")
-                break
 
-        if chars_obtained == chars_needed:
-            obtained_chars[idx] = True
+    def _attempt_character_pulls(self, account, idx, target, obtained_chars):
+        """
+        Attempt to pull all needed characters from this banner.
 
-            if DEBUG_MODE:
-                jewels_spent = jewels_before - account.current_jewels
-                tickets_used = tickets_before - account.owned_plat_tickets
-                print(f"All {chars_needed} character(s) obtained! Used {tickets_used} tickets, {jewels_spent:,} jewels")
-                print(f"Jewels remaining: {account.current_jewels:,}")
+        :param: account: UserAccount with which to perform the pulls
+        :param idx: Current banner index
+        :param target: PullTarget of this banner
+        :param obtained_chars: List tracking which characters were obtained
 
-            return True
-        else:
-            if DEBUG_MODE:
-                print(f"Only got {chars_obtained}/{chars_needed} characters")
-                print(f"Pity carried forward: {account.current_character_pity}")
-                print(f"Jewels remaining: {account.current_jewels:,}")
+        Returns:
+            True if all characters obtained, False otherwise
+        """
+        for _ in range(target.awareness + 1):
+            if not self._pull_character(account):
+                return False
 
-            return False
+        obtained_chars[idx] = True
+
+        return True
 
 
-    def _attempt_weapon_pulls(self, account, idx, banner_config, obtained_weapons):
+    def _attempt_weapon_pulls(self, account, idx, target, obtained_weapons):
         """
         Attempt to pull the base weapon (no refinements).
 
         :param: account: UserAccount with which to perform the pulls
         :param idx: Current banner index
-        :param banner_config: Configuration for this banner
+        :param target: PullTarget of this banner
         :param obtained_weapons: List tracking which weapons were obtained
 
         Returns:
             True if base weapon obtained, False otherwise
         """
-        pull_weapon = banner_config.get("pull_weapon", False)
-
-        if not pull_weapon:
+        if not target.pull_weapon:
             return False
 
-        jewels_before = account.current_jewels
-        coins_before = account.owned_plat_coins
-
-        weap_success = self._pull_weapon(account)
-
-        if weap_success:
-            if DEBUG_MODE:
-                jewels_spent = jewels_before - account.current_jewels
-                coins_used = coins_before - account.owned_plat_coins
-                print(f"Got base weapon! Used {coins_used} coins, {jewels_spent:,} jewels")
-                print(f"Jewels remaining: {account.current_jewels:,}")
+        if not self._pull_weapon(account):
+            return False
 
-            obtained_weapons[idx] = True
-            return True
-        else:
-            if DEBUG_MODE:
-                print(f"Ran out of jewels while pulling base weapon")
-                print(f"Jewels remaining: {account.current_jewels:,}")
+        obtained_weapons[idx] = True
 
-            return False
+        return True
 
 
-    def _calculate_success_rate(self, results, num_runs):
+    def _all_succeeded(self, obtained_chars, obtained_weapons):
         """
-        Calculate the success rate across all simulation runs.
+        Check whether a run obtained every planned character and weapon.
 
-        :param results: List of (obtained_chars, obtained_weapons) tuples from simulations
-        :param num_runs: Total number of simulation runs
+        :param obtained_chars: List tracking which characters were obtained
+        :param obtained_weapons: List tracking which weapons were obtained
 
         Returns:
-            Dictionary with success_rate, successful_runs, and total_runs
+            True if nothing planned was missed, False otherwise
         """
-        successful_runs = 0
-        failure_counts = {}
+        for idx, target in enumerate(self.plan):
+            if not obtained_chars[idx]:
+                return False
 
-        for obtained_chars, obtained_weapons, failures in results:
-            all_succeeded = True
+            if target.pull_weapon and not obtained_weapons[idx]:
+                return False
 
-            for idx, banner_config in enumerate(self.patch_configs.values()):
-                if banner_config.get("pull_char", False):
-                    if not obtained_chars[idx]:
-                        all_succeeded = False
-                        break
+        return True
 
-                if banner_config.get("pull_weapon", False):
-                    if not obtained_weapons[idx]:
-                        all_succeeded = False
-                        break
 
-            if all_succeeded:
-                successful_runs += 1
+def _split_runs(num_runs, chunk_size):
+    """
+    Split num_runs into chunks of chunk_size runs, the last chunk holding the remainder.
+    """
+    full_chunks, remainder = divmod(num_runs, chunk_size)
 
-            for failure in failures:
-                key = (
-                    failure["patch"],
-                    failure["failure_type"],
-                    failure.get("featured_character", "")
-                )
+    return [chunk_size] * full_chunks + ([remainder] if remainder else [])
 
-                if key not in failure_counts:
-                    failure_counts[key] = {
-                        "count": 0,
-                        "obtained_list": [],
-                        "needed": failure.get("needed")
-                    }
 
-                failure_counts[key]["count"] += 1
+def run_chunk_in_worker(simulator, num_runs, seed):
+    return simulator.run_chunk(num_runs, seed)
 
-                if "obtained" in failure and failure["obtained"] > 0:
-                    failure_counts[key]["obtained_list"].append(failure["obtained"])
 
-        success_rate = (successful_runs / num_runs) * 100 if num_runs > 0 else 0
+def solve_exact_in_worker(simulator):
+    return simulator.solve_exact()
 
-        sorted_failures = sorted(
-            failure_counts.items(),
-            key=lambda x: (x[1]["count"], x[0][0], x[0][1]),
-            reverse=True
-        )
 
-        return {
-            "success_rate": success_rate,
-            "successful_runs": successful_runs,
-            "total_runs": num_runs,
-            "failure_breakdown": sorted_failures
-        }
\ No newline at end of file
+def _run_resumable_chunk_in_worker(simulator, num_runs, seed, resume, first_checkpoint):
+    return simulator._run_resumable_chunk(num_runs, seed, resume, first_checkpoint)
@@ -0,0 +1,262 @@
+import json
+from collections import deque
+import numpy as np
+from src.core.random_pool import RandomPool
+from src.core.pull_tables import draw_pulls_to_hit
+from src.core.constants import (
+    CHAR_RATE_TARGETED, CHAR_PITY_TARGETED, CHAR_RATE_CHANCE, CHAR_PITY_CHANCE, WEAPON_RATE, WEAPON_PITY,
+    CHAR_JEWEL_COST, WEAPON_JEWEL_COST, CONIGEM_CONVERSION_RATE, FOUR_STAR_INTERVAL
+)
+from src.model.enum.banner_type import BannerType
+
+
+class TraceEngine:
+    """
+    Scalar engine that records every pull of a single run as a structured event.
+
+    Follows the scalar reference engine of Simulator step by step and consumes its random numbers in the same
+    order, so tracing a chunk seed reproduces the first run of that chunk. Events are dictionaries with an event
+    key of banner (income arrived), pull, failure or run (the outcome), handed to a sink as they happen.
+    Far slower than the reference engine, meant for inspecting single runs only.
+    """
+
+    def __init__(self, simulator, sink):
+        """
+        Initialize the engine for the given simulator configuration.
+
+        :param simulator: Simulator holding the account, banner configs, banner type and luck modifier
+        :param sink: Object with an emit(event) method receiving every event, e.g. RingBufferSink or JsonLinesSink
+        """
+        self.simulator = simulator
+        self.sink = sink
+
+        if simulator.banner_type == BannerType.CHANCE:
+            self.char_rate = CHAR_RATE_CHANCE * simulator.luck_mod
+            self.char_pity_cap = CHAR_PITY_CHANCE
+            self.char_fifty_fifty = True
+        else:
+            self.char_rate = CHAR_RATE_TARGETED * simulator.luck_mod
+            self.char_pity_cap = CHAR_PITY_TARGETED
+            self.char_fifty_fifty = False
+
+        self.weapon_rate = WEAPON_RATE * simulator.luck_mod
+
+        # A 50/50 is lost when a uniform draw is >= this threshold
+        self.fifty_fifty_threshold = 0.5 * simulator.luck_mod
+
+        self.random_pool = None
+        self.pull_index = 0
+
+
+    def run(self, seed=None):
+        """
+        Trace a single run of the simulator's plan.
+
+        :param seed: Seed of the random numbers, defaults to the seed of the forecast's first chunk,
+                     tracing the first run the scalar engine simulates for the simulator's master seed
+
+        Returns:
+            True if the run obtained everything planned, False otherwise
+        """
+        simulator = self.simulator
+
+        if simulator.plan is None:
+            simulator.plan = simulator.compile_plan()
+
+        if seed is None:
+            seed = np.random.SeedSequence(simulator.seed).spawn(1)[0]
+
+        self.random_pool = RandomPool(seed)
+        self.pull_index = 0
+
+        account = simulator.account.clone()
+        all_succeeded = True
+
+        for target in simulator.plan:
+            account.add_jewels(target.jewels)
+            account.add_tickets(target.tickets)
+            account.add_milicoins(target.coins)
+
+            self.sink.emit({
+                "event": "banner",
+                "patch": target.patch_version,
+                "featured_character": target.featured_character,
+                **self._holdings(account)
+            })
+
+            obtained = self._pull_copies(account, target, "character", target.awareness + 1)
+
+            if obtained < target.awareness + 1:
+                self._emit_failure(target, "character")
+                all_succeeded = False
+
+                continue
+
+            if target.pull_weapon and self._pull_copies(account, target, "weapon", 1) < 1:
+                self._emit_failure(target, "weapon")
+                all_succeeded = False
+
+                continue
+
+            duplicates_obtained = self._pull_copies(account, target, "awareness", target.awareness)
+            refinements_obtained = self._pull_copies(account, target, "refinement", target.refinement)
+
+            if duplicates_obtained < target.awareness:
+                self._emit_failure(target, "awareness", duplicates_obtained, target.awareness)
+                all_succeeded = False
+
+            if target.pull_weapon and refinements_obtained < target.refinement:
+                self._emit_failure(target, "refinement", refinements_obtained, target.refinement)
+                all_succeeded = False
+
+        self.sink.emit({"event": "run", "succeeded": all_succeeded, "pulls": self.pull_index, **self._holdings(account)})
+
+        return all_succeeded
+
+
+    def _pull_copies(self, account, target, step, copies):
+        """
+        Pull until the featured unit of the step was obtained copies times or the account runs dry.
+
+        Returns:
+            Number of copies obtained
+        """
+        for copy in range(copies):
+            if not self._pull_featured(account, target, step, copy):
+                return copy
+
+        return copies
+
+
+    def _pull_featured(self, account, target, step, copy):
+        """
+        Pull a single copy of the featured character or weapon, mirroring Simulator._pull_character
+        and Simulator._pull_weapon.
+
+        Returns:
+            True if the copy was obtained, False if the account ran dry
+        """
+        if step in ("character", "awareness"):
+            rate, pity_cap, fifty_fifty = self.char_rate, self.char_pity_cap, self.char_fifty_fifty
+            pity_attribute, counter_attribute = "current_character_pity", "char_pulls_since_4star"
+            spend_currency, currency, jewel_cost = account.spend_ticket, "ticket", CHAR_JEWEL_COST
+        else:
+            rate, pity_cap, fifty_fifty = self.weapon_rate, WEAPON_PITY, True
+            pity_attribute, counter_attribute = "current_weapon_pity", "weapon_pulls_since_4star"
+            spend_currency, currency, jewel_cost = account.spend_milicoin, "coin", WEAPON_JEWEL_COST
+
+        guaranteed_next = False
+
+        while True:
+            pulls = draw_pulls_to_hit(self.random_pool.get_single(), rate, pity_cap, getattr(account, pity_attribute))
+
+            for pull in range(pulls):
+                if spend_currency():
+                    source = currency
+                else:
+                    source = "jewels"
+
+                    if account.current_jewels < jewel_cost and account.violet_conigems >= CONIGEM_CONVERSION_RATE:
+                        account.convert_conigems()
+                        source = "conigems"
+
+                    if not account.spend_jewels(jewel_cost):
+                        return False
+
+                setattr(account, pity_attribute, getattr(account, pity_attribute) + 1)
+                setattr(account, counter_attribute, getattr(account, counter_attribute) + 1)
+
+                pity = getattr(account, pity_attribute)
+                four_star = getattr(account, counter_attribute) >= FOUR_STAR_INTERVAL and pity < pity_cap
+
+                if four_star:
+                    account.add_conigems(CONIGEM_CONVERSION_RATE)
+                    setattr(account, counter_attribute, 0)
+
+                event = {
+                    "event": "pull",
+                    "index": self.pull_index,
+                    "patch": target.patch_version,
+                    "step": step,
+                    "copy": copy,
+                    "source": source,
+                    "pity": pity,
+                    "four_star": four_star,
+                    "five_star": pull == pulls - 1,
+                    "fifty_fifty": None
+                }
+                self.pull_index += 1
+
+                if pull < pulls - 1:
+                    self.sink.emit(event)
+
+            setattr(account, pity_attribute, 0)
+
+            if not fifty_fifty or guaranteed_next:
+                event["fifty_fifty"] = "guaranteed" if guaranteed_next else None
+                self.sink.emit(event)
+
+                return True
+
+            lost = self.random_pool.get_single() >= self.fifty_fifty_threshold
+            event["fifty_fifty"] = "lost" if lost else "won"
+            self.sink.emit(event)
+
+            if not lost:
+                return True
+
+            guaranteed_next = True
+
+
+    def _emit_failure(self, target, failure_type, obtained=None, needed=None):
+        event = {"event": "failure", "patch": target.patch_version, "failure_type": failure_type}
+
+        if obtained is not None:
+            event["obtained"] = obtained
+            event["needed"] = needed
+
+        self.sink.emit(event)
+
+
+    @staticmethod
+    def _holdings(account):
+        return {
+            "jewels": account.current_jewels,
+            "conigems": account.violet_conigems,
+            "tickets": account.owned_plat_tickets,
+            "coins": account.owned_plat_coins,
+            "character_pity": account.current_character_pity,
+            "weapon_pity": account.current_weapon_pity
+        }
+
+
+class RingBufferSink:
+    """
+    Keeps the most recent trace events in memory.
+    """
+
+    def __init__(self, capacity=10_000):
+        """
+        :param capacity: Number of events kept, older events are dropped first
+        """
+        self.events = deque(maxlen=capacity)
+
+
+    def emit(self, event):
+        self.events.append(event)
+
+
+class JsonLinesSink:
+    """
+    Writes every trace event to a text stream as one JSON object per line.
+    """
+
+    def __init__(self, stream):
+        """
+        :param stream: Writable text stream, e.g. an open file or sys.stdout
+        """
+        self.stream = stream
+
+
+    def emit(self, event):
+        self.stream.write(json.dumps(event) + "\n")
@@ -0,0 +1,170 @@
+import os
+import atexit
+import threading
+from multiprocessing import Pool, TimeoutError
+from src.core.cancellation import SimulationCancelled
+
+# Seconds between cancellation checks while waiting on a worker
+CANCEL_POLL_INTERVAL = 0.05
+
+
+class WorkerPool:
+    """
+    Long-lived process pool shared by every simulation of the application.
+
+    The pool is started lazily on first use (or by warm_up) and reused afterwards, so only the first forecast
+    pays for spawning the workers and importing numpy and the simulator in them.
+    """
+
+    def __init__(self, processes=None):
+        """
+        :param processes: Number of worker processes, defaults to the number of CPUs
+        """
+        self._processes = processes
+        self._pool = None
+        self._lock = threading.Lock()
+
+
+    @property
+    def processes(self):
+        return self._processes or os.cpu_count() or 1
+
+
+    def get(self):
+        """
+        Returns:
+            The running multiprocessing Pool, starting it if needed
+        """
+        with self._lock:
+            if self._pool is None:
+                self._pool = Pool(self.processes, initializer=_init_worker)
+
+            return self._pool
+
+
+    def warm_up(self):
+        """
+        Start the pool and wait until its workers have imported the simulator.
+        A single process pool is never used by the simulator and is not started.
+        """
+        if self.processes == 1:
+            return
+
+        self.get().map(_ping, range(self.processes), chunksize=1)
+
+
+    def starmap(self, func, iterable):
+        return self.get().starmap(func, iterable, chunksize=1)
+
+
+    def run_tasks(self, func, tasks):
+        """
+        Run func for every argument tuple of tasks, in-process if there is only one task or one worker.
+
+        Returns:
+            List of results in task order
+        """
+        if len(tasks) == 1 or self.processes == 1:
+            return [func(*task) for task in tasks]
+
+        return self.starmap(func, tasks)
+
+
+    def imap_tasks(self, func, tasks, cancel_token=None):
+        """
+        Lazily run func for every argument tuple of tasks, in-process if there is only one task or one worker.
+
+        A cancelled token is noticed within CANCEL_POLL_INTERVAL while waiting on the workers, which are then
+        terminated right away and restarted on next use. In-process tasks are only checked between tasks.
+
+        :param cancel_token: Optional CancellationToken
+
+        Returns:
+            Iterator over the results in task order, each yielded as soon as it and all earlier tasks are done
+        """
+        if len(tasks) == 1 or self.processes == 1:
+            return self._run_in_process(func, tasks, cancel_token)
+
+        results = self.get().imap(_call_task, [(func, task) for task in tasks], chunksize=1)
+
+        if cancel_token is None:
+            return results
+
+        return self._poll_results(results, len(tasks), cancel_token)
+
+
+    @staticmethod
+    def _run_in_process(func, tasks, cancel_token):
+        for task in tasks:
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+
+            yield func(*task)
+
+
+    def _poll_results(self, results, num_results, cancel_token):
+        for _ in range(num_results):
+            while True:
+                if cancel_token.cancelled:
+                    # Abandoned tasks would keep every core busy, terminating frees them immediately
+                    self.shutdown()
+                    raise SimulationCancelled()
+
+                try:
+                    result = results.next(timeout=CANCEL_POLL_INTERVAL)
+                except TimeoutError:
+                    continue
+
+                yield result
+                break
+
+
+    def resize(self, processes):
+        """
+        Change the number of worker processes. A running pool is shut down and restarted lazily on next use.
+
+        :param processes: Number of worker processes, None for the number of CPUs
+        """
+        if processes == self._processes:
+            return
+
+        self.shutdown()
+        self._processes = processes
+
+
+    def shutdown(self):
+        """
+        Terminate the worker processes, if started.
+        """
+        with self._lock:
+            if self._pool is not None:
+                self._pool.terminate()
+                self._pool.join()
+                self._pool = None
+
+
+def _init_worker():
+    # Import the simulator once per worker instead of on the first task
+    import src.core.simulator
+
+
+def _call_task(func_and_task):
+    func, task = func_and_task
+
+    return func(*task)
+
+
+def _ping(_):
+    return os.getpid()
+
+
+_worker_pool = WorkerPool()
+atexit.register(_worker_pool.shutdown)
+
+
+def get_worker_pool():
+    """
+    Returns:
+        The application wide WorkerPool
+    """
+    return _worker_pool
\ No newline at end of file
@@ -0,0 +1,567 @@
+import argparse
+import json
+import math
+import random
+import sys
+import numpy as np
+from src.cli import build_selections
+from src.core.constants import (
+    CHAR_RATE_TARGETED, CHAR_PITY_TARGETED, CHAR_RATE_CHANCE, CHAR_PITY_CHANCE, WEAPON_RATE, WEAPON_PITY,
+    CHAR_JEWEL_COST, WEAPON_JEWEL_COST, CONIGEM_CONVERSION_RATE, FOUR_STAR_INTERVAL
+)
+from src.core.simulator import Simulator
+from src.core.worker_pool import get_worker_pool
+from src.model.enum.banner_type import BannerType
+from src.model.enum.engine_type import EngineType
+from src.model.enum.simulation_type import SimulationType
+from src.model.simulation_aggregate import SimulationAggregate
+from src.util.paths import get_external_path
+
+# Statistical equivalence harness, run as python -m src.engine_equivalence. Forecasts randomized plans and accounts
+# with an independent pull by pull reference (BernoulliReference) and a candidate engine, tests every reported
+# proportion for a difference and compares the spend and leftover distributions.
+
+# Upper bound of consecutive patches a randomized plan spans, small enough for the exact solver most of the time
+MAX_PLAN_PATCHES = 3
+
+# Proportions with fewer expected events (or non-events) than this are not tested, the normal approximation
+# of the z-tests does not hold for them
+MIN_EXPECTED_COUNT = 5
+
+SIMULATION_TYPE_WEIGHTS = {
+    SimulationType.AVERAGE_LUCK: 0.45,
+    SimulationType.BELOW_AVERAGE_LUCK: 0.45,
+    SimulationType.WORST_LUCK: 0.1
+}
+
+# Runs of the reference forecast deciding whether drawn inputs are worth a trial, and how often inputs are redrawn
+# before settling for the last ones
+PILOT_RUNS = 1_000
+MAX_INPUT_DRAWS = 20
+
+
+class BernoulliReference:
+    """
+    Reference engine drawing every pull as its own Bernoulli trial.
+
+    The engines under test draw whole pity cycles from shared inverse CDF tables. This one follows the game rules
+    pull by pull with the standard library's generator, so a mistake in the tables or in how they are used shows up
+    as a mismatch instead of being shared by both sides. Far too slow for real forecasts.
+    """
+
+    def __init__(self, simulator):
+        """
+        :param simulator: Simulator holding the account, selected banners, banner type and luck modifier
+        """
+        self.simulator = simulator
+        self.plan = simulator.compile_plan()
+
+        if simulator.banner_type == BannerType.CHANCE:
+            character = (CHAR_RATE_CHANCE * simulator.luck_mod, CHAR_PITY_CHANCE, True)
+        else:
+            character = (CHAR_RATE_TARGETED * simulator.luck_mod, CHAR_PITY_TARGETED, False)
+
+        # Rate, hard pity and whether a 50/50 applies, per unit type
+        self.rules = {"character": character, "weapon": (WEAPON_RATE * simulator.luck_mod, WEAPON_PITY, True)}
+        self.random = None
+
+
+    def run(self, num_runs, seed):
+        """
+        Simulate the plan num_runs times, a single time with worst luck.
+
+        :param seed: Integer seed of the generator
+
+        Returns:
+            Results dictionary in the format of Simulator.run_simulations
+        """
+        if self.simulator.simulation_type == SimulationType.WORST_LUCK:
+            num_runs = 1
+
+        self.random = random.Random(seed)
+        aggregate = SimulationAggregate()
+        spent = np.zeros((num_runs, len(self.plan), 3), dtype=np.int64)
+        leftover = np.zeros((num_runs, 3), dtype=np.int64)
+
+        for run in range(num_runs):
+            account = self.simulator.account.clone()
+            failures = self._run(account, spent[run])
+            aggregate.add_run(not failures, failures)
+            leftover[run] = account.holdings()
+
+        aggregate.add_spend([target.patch_version for target in self.plan], spent)
+        aggregate.add_leftover(leftover)
+
+        results = aggregate.to_results()
+        results["seed"] = seed
+
+        return results
+
+
+    def _run(self, account, spent):
+        """
+        Pull on every banner of the plan.
+
+        Returns:
+            List of failure dictionaries in the format of Simulator._run
+        """
+        failures = []
+
+        for idx, target in enumerate(self.plan):
+            account.add_jewels(target.jewels)
+            account.add_tickets(target.tickets)
+            account.add_milicoins(target.coins)
+            spent[idx] = account.holdings()
+
+            failure = {"patch": target.patch_version, "featured_character": target.featured_character}
+
+            if self._pull_copies(account, "character", target.awareness + 1) < target.awareness + 1:
+                failures.append({**failure, "failure_type": "character"})
+            elif target.pull_weapon and self._pull_copies(account, "weapon", 1) < 1:
+                failures.append({**failure, "failure_type": "weapon"})
+            else:
+                duplicates_obtained = self._pull_copies(account, "character", target.awareness)
+                refinements_obtained = self._pull_copies(account, "weapon", target.refinement)
+
+                if duplicates_obtained < target.awareness:
+                    failures.append({**failure, "failure_type": "awareness", "obtained": duplicates_obtained,
+                                     "needed": target.awareness})
+
+                if target.pull_weapon and refinements_obtained < target.refinement:
+                    failures.append({**failure, "failure_type": "refinement", "obtained": refinements_obtained,
+                                     "needed": target.refinement})
+
+            spent[idx] -= account.holdings()
+
+        return failures
+
+
+    def _pull_copies(self, account, unit, copies):
+        """
+        Pull until the featured unit was obtained copies times or the account runs dry.
+
+        Returns:
+            Number of copies obtained
+        """
+        rate, pity_cap, fifty_fifty = self.rules[unit]
+
+        for copy in range(copies):
+            guaranteed_next = False
+
+            while True:
+                if not self._pull_five_star(account, unit, rate, pity_cap):
+                    return copy
+
+                if not fifty_fifty or guaranteed_next or self.random.random() < 0.5 * self.simulator.luck_mod:
+                    break
+
+                guaranteed_next = True
+
+        return copies
+
+
+    def _pull_five_star(self, account, unit, rate, pity_cap):
+        """
+        Pull one at a time until a 5-star hits.
+
+        Returns:
+            True on a hit, False if the account ran dry first
+        """
+        while True:
+            if unit == "character":
+                paid = account.spend_ticket()
+                jewel_cost = CHAR_JEWEL_COST
+            else:
+                paid = account.spend_milicoin()
+                jewel_cost = WEAPON_JEWEL_COST
+
+            if not paid:
+                if account.current_jewels < jewel_cost and account.violet_conigems >= CONIGEM_CONVERSION_RATE:
+                    account.convert_conigems()
+
+                if not account.spend_jewels(jewel_cost):
+                    return False
+
+            if unit == "character":
+                account.increment_character_pity()
+                pity = account.current_character_pity
+                four_star = account.char_pulls_since_4star >= FOUR_STAR_INTERVAL and pity < pity_cap
+            else:
+                account.increment_weapon_pity()
+                pity = account.current_weapon_pity
+                four_star = account.weapon_pulls_since_4star >= FOUR_STAR_INTERVAL and pity < pity_cap
+
+            if four_star and unit == "character":
+                account.reset_character_4star_counter()
+            elif four_star:
+                account.reset_weapon_4star_counter()
+
+            if pity >= pity_cap or self.random.random() < rate:
+                if unit == "character":
+                    account.reset_character_pity()
+                else:
+                    account.reset_weapon_pity()
+
+                return True
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m src.engine_equivalence",
+        description="Check that a candidate engine reproduces the results of a pull by pull reference engine."
+    )
+
+    parser.add_argument("--candidate", choices=["scalar", "batch", "exact"], default="batch")
+    parser.add_argument("--trials", type=int, default=20, help="Number of randomized plans and accounts")
+    parser.add_argument("--runs", type=int, default=20_000, help="Runs per engine and trial")
+    parser.add_argument("--alpha", type=float, default=0.01,
+                        help="Family-wise false alarm rate over all tests, Bonferroni corrected")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the randomized inputs and the forecasts")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes, defaults to the CPU count")
+    parser.add_argument("--output", "-o", default=None, help="Write a JSON report of every test to this file")
+
+    return parser
+
+
+def random_inputs(rng, patches):
+    """
+    Draw a random plan, luck setting and account.
+
+    The plan pulls on a random selection of up to MAX_PLAN_PATCHES consecutive patches. The forecast starts at the
+    first of them, so earlier patches do not pile up enough income to make every trial a certain success.
+
+    :param rng: numpy Generator
+    :param patches: List of patches of the patch database
+
+    Returns:
+        Dictionary of Simulator keyword arguments
+    """
+    start = int(rng.integers(len(patches)))
+    window = patches[start:start + int(rng.integers(1, MAX_PLAN_PATCHES + 1))]
+    plan = {}
+
+    for patch in window:
+        if rng.random() < 0.8:
+            pull_weapon = bool(rng.random() < 0.5)
+            plan[patch["version"]] = {
+                "awareness": int(rng.integers(0, 4)),
+                "pull_weapon": pull_weapon,
+                "refinement": int(rng.integers(0, 3)) if pull_weapon else 0
+            }
+
+    if not plan:
+        plan[window[0]["version"]] = {}
+
+    simulation_types = list(SIMULATION_TYPE_WEIGHTS)
+    simulation_type = simulation_types[rng.choice(len(simulation_types), p=list(SIMULATION_TYPE_WEIGHTS.values()))]
+
+    return {
+        "simulation_type": simulation_type,
+        "banner_type": BannerType(int(rng.integers(len(BannerType)))),
+        "current_jewels": int(rng.integers(0, 20_001)),
+        "plat_tickets": int(rng.integers(0, 31)),
+        "plat_coins": int(rng.integers(0, 21)),
+        "starting_pity_character": int(rng.integers(0, 80)),
+        "starting_pity_weapon": int(rng.integers(0, 70)),
+        "buy_bp": bool(rng.random() < 0.5),
+        "bp_days_left": int(rng.integers(0, 46)),
+        "buy_monthly_sub": bool(rng.random() < 0.5),
+        "sub_days_left": int(rng.integers(0, 31)),
+        "selected_banners": build_selections(patches[start:], plan)
+    }
+
+
+def compare_results(reference, candidate, deterministic=False):
+    """
+    Test every proportion and every spend and leftover distribution both results report for a difference.
+
+    Proportions cover the success rate, the rate of every failure point and, for awareness and refinement failures,
+    the rate of every number of copies obtained. Results of the exact engine are treated as the true probabilities,
+    sampling an outcome they consider impossible always counts as a mismatch. Worst luck leaves nothing to chance,
+    its single runs have to agree exactly.
+
+    :param reference: Results dictionary of the reference engine
+    :param candidate: Results dictionary of the candidate engine
+    :param deterministic: Whether both results come from a single deterministic run
+
+    Returns:
+        List of test dictionaries with name, reference and candidate proportions or means and the two-sided p_value,
+        0 or 1 for exact comparisons
+    """
+    reference_counts = _proportion_counts(reference)
+    candidate_counts = _proportion_counts(candidate)
+    exact = candidate.get("exact", False)
+
+    tests = []
+
+    for name in sorted(set(reference_counts) | set(candidate_counts)):
+        reference_count = reference_counts.get(name, 0)
+        candidate_count = candidate_counts.get(name, 0)
+
+        if deterministic:
+            p_value = _exact_p_value(reference_count / reference["total_runs"],
+                                     candidate_count / candidate["total_runs"])
+        elif exact:
+            expected = min(candidate_count, 1 - candidate_count) * reference["total_runs"]
+            impossible = (candidate_count < 1e-12 < reference_count) or (candidate_count > 1 - 1e-12 and
+                                                                         reference_count < reference["total_runs"])
+
+            if expected < MIN_EXPECTED_COUNT and not impossible:
+                continue
+
+            p_value = _one_proportion_p_value(reference_count, reference["total_runs"], candidate_count)
+        else:
+            pooled = (reference_count + candidate_count) / (reference["total_runs"] + candidate["total_runs"])
+
+            if min(pooled, 1 - pooled) * min(reference["total_runs"], candidate["total_runs"]) < MIN_EXPECTED_COUNT:
+                continue
+
+            p_value = _two_proportion_p_value(reference_count, reference["total_runs"],
+                                              candidate_count, candidate["total_runs"])
+
+        tests.append({
+            "name": name,
+            "reference": reference_count / reference["total_runs"],
+            "candidate": candidate_count / candidate["total_runs"],
+            "p_value": p_value
+        })
+
+    return tests + _distribution_tests(reference, candidate, deterministic)
+
+
+def _distribution_tests(reference, candidate, deterministic):
+    """
+    Compare every spend and leftover histogram both results report, the exact engine reports none.
+
+    Sampled distributions are compared with the two-sample Kolmogorov-Smirnov test on their bins, distributions of a
+    single deterministic run by their only value. Histograms holding a single bin on both sides are not tested.
+    """
+    reference_histograms = _histograms(reference)
+    candidate_histograms = _histograms(candidate)
+    tests = []
+
+    for name in sorted(set(reference_histograms) & set(candidate_histograms)):
+        reference_summary = reference_histograms[name]
+        candidate_summary = candidate_histograms[name]
+
+        if deterministic:
+            p_value = _exact_p_value(reference_summary["mean"], candidate_summary["mean"])
+        else:
+            reference_cdf, candidate_cdf = _aligned_cdfs(reference_summary, candidate_summary)
+
+            if reference_cdf.size < 2:
+                continue
+
+            statistic = float(np.max(np.abs(reference_cdf - candidate_cdf)))
+            p_value = _kolmogorov_smirnov_p_value(statistic, reference["total_runs"], candidate["total_runs"])
+
+        tests.append({
+            "name": name,
+            "reference": reference_summary["mean"],
+            "candidate": candidate_summary["mean"],
+            "p_value": p_value
+        })
+
+    return tests
+
+
+def _histograms(results):
+    histograms = {
+        f"{patch} spend {currency}": summary
+        for patch, currencies in results.get("spend", {}).items() for currency, summary in currencies.items()
+    }
+
+    for currency, summary in results.get("leftover", {}).items():
+        histograms[f"leftover {currency}"] = summary
+
+    return histograms
+
+
+def _aligned_cdfs(reference_summary, candidate_summary):
+    """
+    Cumulative distributions of two histogram summaries of the same bin width over their common range of bins.
+    """
+    bin_width = reference_summary["bin_width"]
+    first_bins = [summary["first_value"] // bin_width for summary in (reference_summary, candidate_summary)]
+    start = min(first_bins)
+    end = max(first_bin + len(summary["counts"])
+              for first_bin, summary in zip(first_bins, (reference_summary, candidate_summary)))
+    cdfs = []
+
+    for first_bin, summary in zip(first_bins, (reference_summary, candidate_summary)):
+        counts = np.zeros(end - start)
+        counts[first_bin - start:first_bin - start + len(summary["counts"])] = summary["counts"]
+        cdfs.append(np.cumsum(counts) / counts.sum())
+
+    return cdfs
+
+
+def _kolmogorov_smirnov_p_value(statistic, runs_a, runs_b):
+    """
+    Asymptotic two-sided p-value of the two-sample Kolmogorov-Smirnov statistic.
+
+    Binned and discrete values make the test conservative, it rather misses a difference than raises a false alarm.
+    """
+    effective_runs = runs_a * runs_b / (runs_a + runs_b)
+    root = math.sqrt(effective_runs)
+    scaled = (root + 0.12 + 0.11 / root) * statistic
+
+    if scaled < 0.3:
+        # The series converges too slowly here, and the p-value is 1 to well within the precision needed
+        return 1.0
+
+    p_value = 2 * sum((-1) ** (j - 1) * math.exp(-2 * j * j * scaled * scaled) for j in range(1, 101))
+
+    return min(max(p_value, 0.0), 1.0)
+
+
+def _exact_p_value(reference, candidate):
+    return 1.0 if abs(reference - candidate) < 1e-9 else 0.0
+
+
+def _proportion_counts(results):
+    counts = {"success": results["successful_runs"]}
+
+    for (patch, failure_type, _), data in results["failure_breakdown"]:
+        counts[f"{patch} {failure_type}"] = data["count"]
+
+        for obtained, count in enumerate(data["obtained_histogram"] or []):
+            counts[f"{patch} {failure_type} obtained {obtained}"] = count
+
+    return counts
+
+
+def _two_proportion_p_value(successes_a, trials_a, successes_b, trials_b):
+    """
+    Two-sided p-value of the pooled two-proportion z-test.
+    """
+    pooled = (successes_a + successes_b) / (trials_a + trials_b)
+    variance = pooled * (1 - pooled) * (1 / trials_a + 1 / trials_b)
+
+    if variance <= 0:
+        # Both samples sit at the same boundary
+        return 1.0
+
+    z = (successes_a / trials_a - successes_b / trials_b) / math.sqrt(variance)
+
+    return math.erfc(abs(z) / math.sqrt(2))
+
+
+def _one_proportion_p_value(successes, trials, probability):
+    """
+    Two-sided p-value of the z-test of a sampled proportion against a known probability.
+    """
+    # Exact probabilities carry floating point noise at the boundaries
+    probability = min(max(probability, 0.0), 1.0)
+    variance = probability * (1 - probability) / trials
+    difference = successes / trials - probability
+
+    if variance <= 1e-15:
+        return 1.0 if abs(difference) < 1e-9 else 0.0
+
+    return math.erfc(abs(difference) / math.sqrt(variance) / math.sqrt(2))
+
+
+def run_trials(candidate, trials, runs, seed):
+    """
+    Forecast randomized inputs with the reference and the candidate engine.
+
+    Inputs are redrawn until a pilot forecast of the reference sees enough successes and failures for the
+    proportions to be tested, worst luck trials are compared exactly and always kept.
+
+    Returns:
+        List of trial dictionaries with the inputs, the tests or the reason the trial was skipped
+    """
+    with open(get_external_path("patch_db.json"), "r") as f:
+        patches = json.load(f).get("patches", [])
+
+    rng = np.random.default_rng(seed)
+    seeds = np.random.SeedSequence(seed).generate_state(3 * trials)
+    report = []
+
+    for trial in range(trials):
+        for attempt in range(MAX_INPUT_DRAWS):
+            inputs = random_inputs(rng, patches)
+
+            if _worth_testing(inputs, int(seeds[3 * trial + 2]) + attempt):
+                break
+
+        reference = BernoulliReference(Simulator(**inputs))
+        candidate_simulator = Simulator(**inputs, engine_type=candidate, seed=int(seeds[3 * trial + 1]))
+        deterministic = inputs["simulation_type"] == SimulationType.WORST_LUCK
+
+        entry = {
+            "trial": trial,
+            "simulation_type": inputs["simulation_type"].name,
+            "banner_type": inputs["banner_type"].name,
+            "plan": {version: config for version, config in inputs["selected_banners"].items() if config["pull_char"]}
+        }
+
+        try:
+            candidate_results = candidate_simulator.run_simulations(max_runs=runs)
+        except ValueError as e:
+            entry["skipped"] = str(e)
+            report.append(entry)
+            continue
+
+        entry["tests"] = compare_results(reference.run(runs, int(seeds[3 * trial])), candidate_results, deterministic)
+        report.append(entry)
+
+    return report
+
+
+def _worth_testing(inputs, seed):
+    """
+    Whether the success rate of the inputs is far enough from 0 and 100% for a trial to test something.
+    """
+    if inputs["simulation_type"] == SimulationType.WORST_LUCK:
+        return True
+
+    successful_runs = BernoulliReference(Simulator(**inputs)).run(PILOT_RUNS, seed)["successful_runs"]
+
+    return MIN_EXPECTED_COUNT <= successful_runs <= PILOT_RUNS - MIN_EXPECTED_COUNT
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.workers is not None:
+        get_worker_pool().resize(args.workers)
+
+    try:
+        report = run_trials(EngineType[args.candidate.upper()], args.trials, args.runs, args.seed)
+    finally:
+        get_worker_pool().shutdown()
+
+    num_tests = sum(len(entry.get("tests", [])) for entry in report)
+    threshold = args.alpha / max(num_tests, 1)
+    discrepancies = 0
+
+    for entry in report:
+        if "skipped" in entry:
+            print(f"Trial {entry['trial']}: skipped, {entry['skipped']}")
+            continue
+
+        failed = [test for test in entry["tests"] if test["p_value"] < threshold]
+        discrepancies += len(failed)
+        smallest = min((test["p_value"] for test in entry["tests"]), default=1.0)
+
+        print(f"Trial {entry['trial']} ({entry['simulation_type']}, {entry['banner_type']}, "
+              f"{len(entry['plan'])} banners): {len(entry['tests'])} tests, smallest p-value {smallest:.3g}")
+
+        for test in failed:
+            print(f"  MISMATCH {test['name']}: reference {test['reference']:.4f}, candidate {test['candidate']:.4f}, "
+                  f"p = {test['p_value']:.3g}")
+
+    print(f"{num_tests} tests, {discrepancies} significant at a family-wise alpha of {args.alpha}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"alpha": args.alpha, "threshold": threshold, "trials": report}, f, indent=2)
+
+    return 1 if discrepancies else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,16 +3,23 @@ import ttkbootstrap as ttk
 
 
 class LoadingPopup(ttk.Toplevel):
-    def __init__(self, parent):
+    def __init__(self, parent, on_cancel=None):
+        """
+        :param parent: Window the popup is centered on
+        :param on_cancel: Optional callable invoked when the user cancels, also when closing the popup
+        """
         super().__init__(parent)
 
+        self.on_cancel = on_cancel
+        self.cancelling = False
+
         self.title("Running Simulation")
-        self.geometry("400x150")
+        self.geometry("400x190")
         self.resizable(False, False)
 
         self.update_idletasks()
         x = parent.winfo_x() + (parent.winfo_width() // 2) - (400 // 2)
-        y = parent.winfo_y() + (parent.winfo_height() // 2) - (150 // 2)
+        y = parent.winfo_y() + (parent.winfo_height() // 2) - (190 // 2)
         self.geometry(f"+{x}+{y}")
 
         self.transient(parent)
@@ -45,9 +52,55 @@ class LoadingPopup(ttk.Toplevel):
         )
         self.status_label.pack()
 
+        self.cancel_button = ttk.Button(
+            container,
+            text="Cancel",
+            bootstyle="secondary",
+            command=self._cancel,
+            state="normal" if on_cancel else "disabled"
+        )
+        self.cancel_button.pack(pady=(10, 0))
+
+        self.protocol("WM_DELETE_WINDOW", self._cancel)
+
         pywinstyles.apply_style(self, "dark")
 
 
+    def _cancel(self):
+        if self.on_cancel is None or self.cancelling:
+            return
+
+        self.cancelling = True
+        self.cancel_button.configure(state="disabled")
+        self.status_label.configure(text="Cancelling...")
+        self.on_cancel()
+
+
+    def update_progress(self, progress):
+        """
+        Show the progress reported by Simulator.run_simulations.
+
+        :param progress: Progress dictionary of the running forecast
+        """
+        if self.cancelling:
+            return
+
+        if str(self.progress.cget("mode")) == "indeterminate":
+            self.progress.stop()
+            self.progress.configure(mode="determinate", maximum=100)
+
+        self.progress.configure(value=progress["fraction"] * 100)
+
+        status = f"{progress['fraction'] * 100:.0f}% done"
+
+        if progress["eta"] is not None:
+            status += f", about {progress['eta']:.0f}s left"
+
+        status += f"\nSuccess rate so far: {progress['success_rate']:.2f}%"
+
+        self.status_label.configure(text=status)
+
+
     def close(self):
         self.progress.stop()
         self.grab_release()
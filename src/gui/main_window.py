@@ -5,6 +5,9 @@ import ttkbootstrap as ttk
 import src.gui.helpers.validators as validators
 from tkinter import PhotoImage, messagebox
 from src.core.simulator import Simulator
+from src.core.cancellation import CancellationToken, SimulationCancelled
+from src.core.result_cache import ResultCache
+from src.core.forecast_checkpoints import ForecastCheckpoints
 from ttkbootstrap.widgets import ToolTip
 from src.gui.loading_popup import LoadingPopup
 from src.gui.results_popup import ResultsPopup
@@ -36,6 +39,8 @@ class MainWindow(ttk.Window):
 
         self.banner_selector = None
         self.loading_popup = None
+        self.result_cache = ResultCache(directory=get_external_path("result_cache"))
+        self.forecast_checkpoints = ForecastCheckpoints()
 
         self._add_scroll_config()
         self._build_gui()
@@ -371,23 +376,37 @@ class MainWindow(ttk.Window):
             self.banner_selector.get_selections()
         )
 
-        self.loading_popup = LoadingPopup(self)
+        cancel_token = CancellationToken()
+
+        self.loading_popup = LoadingPopup(self, on_cancel=cancel_token.cancel)
         self.loading_popup.lift()
         self.loading_popup.grab_set()
 
-        thread = threading.Thread(target=self._run_simulation_thread, args=(sim,), daemon=True)
+        thread = threading.Thread(target=self._run_simulation_thread, args=(sim, cancel_token), daemon=True)
         thread.start()
 
 
-    def _run_simulation_thread(self, sim):
+    def _run_simulation_thread(self, sim, cancel_token):
         try:
-            results = sim.run_simulations()
+            results = sim.run_simulations(
+                progress=lambda progress: self.after(0, self._on_simulation_progress, progress),
+                cancel_token=cancel_token,
+                cache=self.result_cache,
+                checkpoints=self.forecast_checkpoints
+            )
 
             self.after(0, self._on_simulation_complete, results)
+        except SimulationCancelled:
+            self.after(0, self._on_simulation_cancelled)
         except Exception as e:
             self.after(0, self._on_simulation_error, str(e))
 
 
+    def _on_simulation_progress(self, progress):
+        if self.loading_popup:
+            self.loading_popup.update_progress(progress)
+
+
     def _on_simulation_complete(self, results):
         if self.loading_popup:
             self.loading_popup.close()
@@ -398,6 +417,12 @@ class MainWindow(ttk.Window):
         results_popup.grab_set()
 
 
+    def _on_simulation_cancelled(self):
+        if self.loading_popup:
+            self.loading_popup.close()
+            self.loading_popup = None
+
+
     def _on_simulation_error(self, error_message):
         if self.loading_popup:
             self.loading_popup.close()
@@ -55,11 +55,36 @@ class ResultsPopup(ttk.Toplevel):
             color_style = "danger"
 
         text_widget.insert("end", f"Success Rate: {success_rate:.2f}%\n", color_style)
-        text_widget.insert(
-            "end",
-            f"Successfully obtained all desired characters and weapons\nin {successful_runs:,} out of {total_runs:,} simulations\n",
-            "details"
-        )
+        exact = results.get("exact", False)
+
+        if exact:
+            text_widget.insert("end", "Exact probability of obtaining all desired characters and weapons\n", "details")
+        else:
+            text_widget.insert(
+                "end",
+                f"Successfully obtained all desired characters and weapons\nin {successful_runs:,} out of {total_runs:,} simulations\n",
+                "details"
+            )
+
+        if results.get("exact_fallback", False):
+            text_widget.insert(
+                "end",
+                "Too many possible outcomes to solve this plan exactly, the rate is estimated from simulations instead\n",
+                "details"
+            )
+
+        if not exact and total_runs > 1 and "confidence_interval" in results:
+            lower, upper = results["confidence_interval"]
+            text_widget.insert("end", f"95% confidence interval: {lower:.2f}% - {upper:.2f}%\n", "details")
+
+        leftover_jewels = results.get("leftover", {}).get("jewels")
+
+        if leftover_jewels and leftover_jewels["p50"] is not None:
+            text_widget.insert(
+                "end",
+                f"Jewels left at the end: {leftover_jewels['p10']:,} / {leftover_jewels['p50']:,} / {leftover_jewels['p90']:,} (10th / 50th / 90th percentile)\n",
+                "details"
+            )
 
         if results.get("failure_breakdown"):
             text_widget.insert("end", "Failure Points\n", "section_title")
@@ -73,15 +98,17 @@ class ResultsPopup(ttk.Toplevel):
                     failure_text = f"Patch {banner_version}: Failed to obtain {char_name}\n"
                 elif failure_type == "weapon":
                     failure_text = f"Patch {banner_version}: Failed to obtain {char_name}'s weapon\n"
-                elif failure_type == "duplicate":
-                    if data["obtained_list"]:
-                        avg_obtained = sum(data["obtained_list"]) / len(data["obtained_list"])
+                elif failure_type == "awareness":
+                    avg_obtained = self._average_obtained(data["obtained_histogram"])
+
+                    if avg_obtained is not None:
                         failure_text = f"Patch {banner_version}: Failed to obtain all of {char_name}'s Awarenesses (Avg: {avg_obtained:.1f} of {data['needed']})\n"
                     else:
                         failure_text = f"Patch {banner_version}: Failed to obtain all of {char_name}'s Awarenesses\n"
                 elif failure_type == "refinement":
-                    if data["obtained_list"]:
-                        avg_obtained = sum(data["obtained_list"]) / len(data["obtained_list"])
+                    avg_obtained = self._average_obtained(data["obtained_histogram"])
+
+                    if avg_obtained is not None:
                         failure_text = f"Patch {banner_version}: Failed to obtain all {char_name} Refinements (Avg: {avg_obtained:.1f} of {data['needed']})\n"
                     else:
                         failure_text = f"Patch {banner_version}: Failed to obtain all {char_name} Refinements\n"
@@ -89,11 +116,28 @@ class ResultsPopup(ttk.Toplevel):
                     failure_text = f"Patch {banner_version}: {failure_type}\n"
 
                 text_widget.insert("end", failure_text, "failure_text")
-                text_widget.insert(
-                    "end",
-                    f"Failed in {failure_pct:.1f}% of runs ({count:,} / {total_runs:,})\n",
-                    "failure_pct"
-                )
+                if exact:
+                    failure_pct_text = f"Fails with a probability of {failure_pct:.2f}%\n"
+                else:
+                    failure_pct_text = f"Failed in {failure_pct:.1f}% of runs ({count:,} / {total_runs:,})\n"
+
+                text_widget.insert("end", failure_pct_text, "failure_pct")
 
         text_widget.configure(state="disabled")
-        text_widget.configure(padx=10, pady=10)
\ No newline at end of file
+        text_widget.configure(padx=10, pady=10)
+
+
+    @staticmethod
+    def _average_obtained(obtained_histogram):
+        """
+        Average number of copies obtained by the failed runs that obtained at least one.
+
+        Returns:
+            The average, or None if no failed run obtained any copy
+        """
+        runs = sum(obtained_histogram[1:])
+
+        if runs == 0:
+            return None
+
+        return sum(obtained * count for obtained, count in enumerate(obtained_histogram)) / runs
\ No newline at end of file
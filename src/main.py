@@ -4,16 +4,25 @@ try:
 except:
     pass
 
+import threading
 import multiprocessing
 from src.gui.main_window import MainWindow
+from src.core.worker_pool import get_worker_pool
 from src.data.patch_db_updater import DBUpdater
 
 
 if __name__ == "__main__":
     multiprocessing.freeze_support()
 
+    # Start the simulation workers in the background so the first forecast does not pay for it
+    worker_pool = get_worker_pool()
+    threading.Thread(target=worker_pool.warm_up, daemon=True).start()
+
     db_updater = DBUpdater()
     db_updater.check_and_update()
 
-    window = MainWindow()
-    window.mainloop()
+    try:
+        window = MainWindow()
+        window.mainloop()
+    finally:
+        worker_pool.shutdown()
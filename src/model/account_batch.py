@@ -0,0 +1,64 @@
+import numpy as np
+from src.core.constants import CONIGEM_WEALTH
+
+# Currencies and counters stay far below 2^31, halving the memory of every in-flight run compared to int64
+ACCOUNT_DTYPE = np.int32
+
+
+class AccountBatch:
+    """
+    Struct-of-arrays counterpart of UserAccount for batched runs, index i of every array belonging to run i.
+    """
+    __slots__ = (
+        "jewels", "tickets", "coins", "conigems", "char_pity", "weapon_pity", "char_4star", "weapon_4star"
+    )
+
+    def __init__(self, account, num_runs):
+        """
+        Initialize num_runs copies of an account.
+
+        :param account: UserAccount every run starts from
+        :param num_runs: Number of runs
+        """
+        # Currency
+        self.jewels = np.full(num_runs, account.current_jewels, dtype=ACCOUNT_DTYPE)
+        self.tickets = np.full(num_runs, account.owned_plat_tickets, dtype=ACCOUNT_DTYPE)
+        self.coins = np.full(num_runs, account.owned_plat_coins, dtype=ACCOUNT_DTYPE)
+        self.conigems = np.full(num_runs, account.violet_conigems, dtype=ACCOUNT_DTYPE)
+
+        # Pity counters
+        self.char_pity = np.full(num_runs, account.current_character_pity, dtype=ACCOUNT_DTYPE)
+        self.weapon_pity = np.full(num_runs, account.current_weapon_pity, dtype=ACCOUNT_DTYPE)
+        self.char_4star = np.full(num_runs, account.char_pulls_since_4star, dtype=ACCOUNT_DTYPE)
+        self.weapon_4star = np.full(num_runs, account.weapon_pulls_since_4star, dtype=ACCOUNT_DTYPE)
+
+
+    def copy(self):
+        """
+        Returns:
+            Independent copy of every run's state
+        """
+        batch = AccountBatch.__new__(AccountBatch)
+
+        for name in AccountBatch.__slots__:
+            setattr(batch, name, getattr(self, name).copy())
+
+        return batch
+
+
+    def add_income(self, jewels, tickets, coins):
+        """
+        Adds the same income to every run.
+        """
+        self.jewels += jewels
+        self.tickets += tickets
+        self.coins += coins
+
+
+    def holdings(self):
+        """
+        Returns:
+            Array of shape (runs, 3) with the jewel wealth (jewels plus the jewel value of violet conigems),
+            platinum tickets and milicoins of every run
+        """
+        return np.stack((self.jewels.astype(np.int64) + self.conigems * CONIGEM_WEALTH, self.tickets, self.coins), axis=1)
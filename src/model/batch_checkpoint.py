@@ -0,0 +1,22 @@
+class BatchCheckpoint:
+    """
+    State of a chunk of batched runs right after a banner, enough to continue the chunk from there.
+
+    Resuming restores the position of every run's random stream as well, so a resumed chunk produces the same
+    results as running it from the start.
+    """
+    __slots__ = ("banners_done", "accounts", "all_succeeded", "aggregate", "draw_counters")
+
+    def __init__(self, banners_done, accounts, all_succeeded, aggregate, draw_counters):
+        """
+        :param banners_done: Number of leading pull targets of the plan already simulated
+        :param accounts: AccountBatch after the last of them
+        :param all_succeeded: Per-run boolean array, whether every banner so far was fully obtained
+        :param aggregate: SimulationAggregate with the failures and spend of the banners so far
+        :param draw_counters: Per-run number of random numbers drawn from the runs' streams
+        """
+        self.banners_done = banners_done
+        self.accounts = accounts
+        self.all_succeeded = all_succeeded
+        self.aggregate = aggregate
+        self.draw_counters = draw_counters
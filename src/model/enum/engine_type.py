@@ -0,0 +1,6 @@
+from enum import Enum
+
+class EngineType(Enum):
+    SCALAR = 0
+    BATCH = 1
+    EXACT = 2
\ No newline at end of file
@@ -0,0 +1,106 @@
+import numpy as np
+
+
+class Histogram:
+    """
+    Mergeable fixed-width histogram of integer values.
+
+    Workers summarize their runs into histograms, so memory stays bounded no matter how many runs are simulated.
+    Percentiles are accurate to the bin width, means are exact.
+    """
+
+    def __init__(self, bin_width=1):
+        """
+        :param bin_width: Width of every bin, bin i covering [i * bin_width, (i + 1) * bin_width)
+        """
+        self.bin_width = bin_width
+        self.first_bin = 0
+        self.counts = np.zeros(0)
+        self.total = 0.0
+        self.sum = 0.0
+
+
+    def add(self, values, weights=None):
+        """
+        Adds values to the histogram.
+
+        :param values: Array of integer values
+        :param weights: Optional array with the weight of every value, 1 each if None
+        """
+        values = np.asarray(values, dtype=np.int64)
+
+        if values.size == 0:
+            return
+
+        bins = values // self.bin_width
+        first_bin = int(bins.min())
+        counts = np.bincount(bins - first_bin, weights=weights)
+
+        self._add_counts(first_bin, counts)
+        self.total += float(counts.sum())
+        self.sum += float(np.dot(values, weights) if weights is not None else values.sum())
+
+
+    def merge(self, other):
+        """
+        Merges another histogram of the same bin width into this one.
+
+        Returns:
+            This histogram
+        """
+        if other.counts.size:
+            self._add_counts(other.first_bin, other.counts)
+
+        self.total += other.total
+        self.sum += other.sum
+
+        return self
+
+
+    def percentile(self, q):
+        """
+        Returns:
+            Lower edge of the bin holding the q-th percentile, None if the histogram is empty
+        """
+        if self.total == 0:
+            return None
+
+        cumulative = np.cumsum(self.counts)
+        position = int(np.searchsorted(cumulative, q / 100 * self.total, side="left"))
+
+        return (self.first_bin + min(position, self.counts.size - 1)) * self.bin_width
+
+
+    def to_results(self):
+        """
+        Build the summary dictionary.
+
+        Returns:
+            Dictionary with mean, p10, p50, p90, bin_width, first_value and counts
+        """
+        return {
+            "mean": self.sum / self.total if self.total else None,
+            "p10": self.percentile(10),
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "bin_width": self.bin_width,
+            "first_value": self.first_bin * self.bin_width,
+            "counts": self.counts.tolist()
+        }
+
+
+    def _add_counts(self, first_bin, counts):
+        if self.counts.size == 0:
+            self.first_bin = first_bin
+            self.counts = np.zeros(counts.size)
+
+        start = min(self.first_bin, first_bin)
+        end = max(self.first_bin + self.counts.size, first_bin + counts.size)
+
+        if start != self.first_bin or end != self.first_bin + self.counts.size:
+            grown = np.zeros(end - start)
+            grown[self.first_bin - start:self.first_bin - start + self.counts.size] = self.counts
+            self.first_bin = start
+            self.counts = grown
+
+        self.counts[first_bin - start:first_bin - start + counts.size] += counts
@@ -0,0 +1,17 @@
+from typing import NamedTuple
+
+
+class PullTarget(NamedTuple):
+    """
+    Compiled, immutable form of a banner the player pulls on.
+    """
+    patch_version: str
+    featured_character: str
+    awareness: int
+    pull_weapon: bool
+    refinement: int
+
+    # Income gathered since the previous pull target, added before pulling on this banner
+    jewels: int
+    tickets: int
+    coins: int
@@ -0,0 +1,201 @@
+from src.core.confidence_interval import wilson_interval
+from src.core.profiling import Profile
+from src.model.histogram import Histogram
+
+# Currencies whose spend and leftovers are recorded, in the order of the last axis of the recorded arrays
+CURRENCIES = ("jewels", "tickets", "coins")
+
+# Jewel amounts are summarized in steps of 100, tickets and coins exactly
+CURRENCY_BIN_WIDTHS = {"jewels": 100, "tickets": 1, "coins": 1}
+
+
+class SimulationAggregate:
+    """
+    Mergeable summary of simulation runs.
+
+    Workers fill an aggregate locally and the parent process only combines the small partial aggregates,
+    so individual run results never have to leave the worker.
+    """
+
+    def __init__(self):
+        self.total_runs = 0
+        self.successful_runs = 0
+
+        # (patch, failure_type, featured_character) -> {"count", "needed", "obtained_histogram"}
+        self.failure_counts = {}
+
+        # (patch, currency) -> Histogram of what runs spent on that banner, jewels net of 4-star conigem refunds
+        self.spend = {}
+
+        # currency -> Histogram of what runs had left after the last banner, conigems counted as jewels
+        self.leftover = {}
+
+        # Profile of the chunks merged into this aggregate, None unless the forecast is profiled
+        self.profile = None
+
+
+    def add_runs(self, num_runs, successful_runs):
+        """
+        Adds finished runs to the aggregate.
+
+        :param num_runs: Number of finished runs
+        :param successful_runs: How many of them obtained every planned character and weapon
+        """
+        self.total_runs += num_runs
+        self.successful_runs += successful_runs
+
+
+    def add_failures(self, key, count, needed=None, obtained_histogram=None):
+        """
+        Adds failures of one kind to the aggregate.
+
+        :param key: Tuple of (patch, failure_type, featured_character)
+        :param count: Number of runs that failed this way
+        :param needed: Number of awareness/refinement copies that were needed, None for base pulls
+        :param obtained_histogram: Sequence where index i holds the number of failed runs that obtained i copies
+        """
+        if count == 0:
+            return
+
+        if key not in self.failure_counts:
+            self.failure_counts[key] = {
+                "count": 0,
+                "needed": needed,
+                "obtained_histogram": None if needed is None else [0] * (needed + 1)
+            }
+
+        entry = self.failure_counts[key]
+        entry["count"] += count
+
+        if obtained_histogram is not None:
+            for obtained, runs in enumerate(obtained_histogram):
+                entry["obtained_histogram"][obtained] += runs
+
+
+    def add_spend(self, patch_versions, spent):
+        """
+        Adds the spend of runs to the aggregate.
+
+        :param patch_versions: Patch version of every pull target in spent
+        :param spent: Array of shape (runs, pull targets, currencies) with what every run spent per banner
+        """
+        for position, currency in enumerate(CURRENCIES):
+            for target, patch_version in enumerate(patch_versions):
+                self._histogram(self.spend, (patch_version, currency), currency).add(spent[:, target, position])
+
+
+    def add_leftover(self, leftover):
+        """
+        Adds the currency finished runs had left to the aggregate.
+
+        :param leftover: Array of shape (runs, currencies) with what every run had left at the end
+        """
+        for position, currency in enumerate(CURRENCIES):
+            self._histogram(self.leftover, currency, currency).add(leftover[:, position])
+
+
+    @staticmethod
+    def _histogram(histograms, key, currency):
+        if key not in histograms:
+            histograms[key] = Histogram(CURRENCY_BIN_WIDTHS[currency])
+
+        return histograms[key]
+
+
+    def add_run(self, succeeded, failures):
+        """
+        Adds a single run in the format returned by Simulator._run.
+
+        :param succeeded: Whether the run obtained every planned character and weapon
+        :param failures: List of failure dicts of the run
+        """
+        self.add_runs(1, 1 if succeeded else 0)
+
+        for failure in failures:
+            key = (
+                failure["patch"],
+                failure["failure_type"],
+                failure.get("featured_character", "")
+            )
+
+            needed = failure.get("needed")
+            obtained_histogram = None
+
+            if "obtained" in failure:
+                obtained_histogram = [0] * (needed + 1)
+                obtained_histogram[failure["obtained"]] = 1
+
+            self.add_failures(key, 1, needed, obtained_histogram)
+
+
+    def merge(self, other):
+        """
+        Merges another aggregate into this one.
+
+        Returns:
+            This aggregate
+        """
+        self.add_runs(other.total_runs, other.successful_runs)
+
+        for key, data in other.failure_counts.items():
+            self.add_failures(key, data["count"], data["needed"], data["obtained_histogram"])
+
+        for key, histogram in other.spend.items():
+            self._histogram(self.spend, key, key[1]).merge(histogram)
+
+        for currency, histogram in other.leftover.items():
+            self._histogram(self.leftover, currency, currency).merge(histogram)
+
+        if other.profile is not None:
+            if self.profile is None:
+                self.profile = Profile()
+
+            self.profile.merge(other.profile)
+
+        return self
+
+
+    def confidence_interval(self):
+        """
+        95% Wilson confidence interval of the success rate.
+
+        Returns:
+            Tuple of (lower, upper) bounds in percent
+        """
+        lower, upper = wilson_interval(self.successful_runs, self.total_runs)
+
+        return lower * 100, upper * 100
+
+
+    def to_results(self):
+        """
+        Build the results dictionary.
+
+        Returns:
+            Dictionary with success_rate, confidence_interval, successful_runs, total_runs, failure_breakdown,
+            spend (patch -> currency -> summary) and leftover (currency -> summary),
+            summaries as built by Histogram.to_results
+        """
+        total_runs = self.total_runs
+        success_rate = (self.successful_runs / total_runs) * 100 if total_runs > 0 else 0
+
+        sorted_failures = sorted(
+            self.failure_counts.items(),
+            key=lambda x: (x[1]["count"], x[0][0], x[0][1]),
+            reverse=True
+        )
+
+        spend = {}
+
+        for (patch_version, currency), histogram in self.spend.items():
+            spend.setdefault(patch_version, {})[currency] = histogram.to_results()
+
+        return {
+            "success_rate": success_rate,
+            "confidence_interval": self.confidence_interval(),
+            "successful_runs": self.successful_runs,
+            "total_runs": total_runs,
+            "failure_breakdown": sorted_failures,
+            "spend": spend,
+            "leftover": {currency: histogram.to_results() for currency, histogram in self.leftover.items()}
+        }
\ No newline at end of file
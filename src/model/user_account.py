@@ -1,9 +1,17 @@
-import copy
+from src.core.constants import CONIGEM_CONVERSION_RATE, CONIGEM_JEWEL_VALUE, CONIGEM_WEALTH
+
 
 class UserAccount:
     """
     Manages players jewels, tickets, coins and pity counter
     """
+    # No per-instance __dict__, accounts are cloned once per simulation run
+    __slots__ = (
+        "current_jewels", "owned_plat_tickets", "owned_plat_coins", "violet_conigems",
+        "current_character_pity", "current_weapon_pity", "char_pulls_since_4star", "weapon_pulls_since_4star",
+        "buy_bp", "bp_days_left", "buy_sub", "sub_days_left", "daily_jewels"
+    )
+
     def __init__(
             self,
             current_jewels,
@@ -133,16 +141,24 @@ class UserAccount:
             Number of conversions performed
         """
 
-        if self.violet_conigems >= 10:
-            conversions = self.violet_conigems // 10
-            self.current_jewels += conversions * 100
-            self.violet_conigems -= conversions * 10
+        if self.violet_conigems >= CONIGEM_CONVERSION_RATE:
+            conversions = self.violet_conigems // CONIGEM_CONVERSION_RATE
+            self.current_jewels += conversions * CONIGEM_JEWEL_VALUE
+            self.violet_conigems -= conversions * CONIGEM_CONVERSION_RATE
 
             return conversions
 
         return 0
 
 
+    def holdings(self):
+        """
+        Returns:
+            Tuple of jewel wealth (jewels plus the jewel value of violet conigems), platinum tickets and milicoins
+        """
+        return self.current_jewels + self.violet_conigems * CONIGEM_WEALTH, self.owned_plat_tickets, self.owned_plat_coins
+
+
     def increment_character_pity(self):
         self.current_character_pity += 1
         self.char_pulls_since_4star += 1
@@ -153,7 +169,7 @@ class UserAccount:
 
 
     def reset_character_4star_counter(self):
-        self.add_conigems(10)
+        self.add_conigems(CONIGEM_CONVERSION_RATE)
         self.char_pulls_since_4star = 0
 
 
@@ -167,9 +183,27 @@ class UserAccount:
 
 
     def reset_weapon_4star_counter(self):
-        self.add_conigems(10)
+        self.add_conigems(CONIGEM_CONVERSION_RATE)
         self.weapon_pulls_since_4star = 0
 
 
     def clone(self):
-        return copy.copy(self)
\ No newline at end of file
+        clone = UserAccount.__new__(UserAccount)
+
+        clone.current_jewels = self.current_jewels
+        clone.owned_plat_tickets = self.owned_plat_tickets
+        clone.owned_plat_coins = self.owned_plat_coins
+        clone.violet_conigems = self.violet_conigems
+
+        clone.current_character_pity = self.current_character_pity
+        clone.current_weapon_pity = self.current_weapon_pity
+        clone.char_pulls_since_4star = self.char_pulls_since_4star
+        clone.weapon_pulls_since_4star = self.weapon_pulls_since_4star
+
+        clone.buy_bp = self.buy_bp
+        clone.bp_days_left = self.bp_days_left
+        clone.buy_sub = self.buy_sub
+        clone.sub_days_left = self.sub_days_left
+        clone.daily_jewels = self.daily_jewels
+
+        return clone
\ No newline at end of file